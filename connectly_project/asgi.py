@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'connectly_project.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from posts.uploads import BodySizeLimitMiddleware  # noqa: E402 (needs the app registry)
+
+# Reject oversized bodies before Django spools them to disk
+application = BodySizeLimitMiddleware(django_application)
@@ -153,6 +153,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'connectly_project.wsgi.application'
+ASGI_APPLICATION = 'connectly_project.asgi.application'
 
 # Database
 import dj_database_url
@@ -164,6 +165,24 @@ DATABASES = {
     )
 }
 
+# Cache (feed pages); locmem by default, set CACHE_BACKEND/CACHE_LOCATION for
+# e.g. django.core.cache.backends.filebased.FileBasedCache and a directory
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'connectly-cache'),
+    }
+}
+
+# Live event pub/sub; the in-memory broker only reaches streams in the same
+# process, use posts.pubsub.RedisBroker with REDIS_URL to share events
+EVENT_BROKER = os.getenv('EVENT_BROKER', 'posts.pubsub.InMemoryBroker')
+REDIS_URL = os.getenv('REDIS_URL')
+
+# Buffer like count changes in each worker and write them in batches
+# (posts.like_buffer); Like rows themselves are always written immediately
+LIKE_COUNT_WRITE_BEHIND = os.getenv('LIKE_COUNT_WRITE_BEHIND', 'False') == 'True'
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -204,17 +223,24 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Let the front proxy send media bytes: 'x-accel' (nginx, internal location at
+# MEDIA_ACCEL_PREFIX aliased to MEDIA_ROOT) or 'x-sendfile'; empty serves from Python
+MEDIA_ACCEL = os.getenv('MEDIA_ACCEL', '')
+MEDIA_ACCEL_PREFIX = os.getenv('MEDIA_ACCEL_PREFIX', '/protected-media/')
 
 # File Upload Settings
+# Files are streamed to disk and hashed chunk by chunk; the size limit is
+# ConfigManager's MAX_FILE_SIZE, enforced while the upload is being read under
+# WSGI and before the body is read under ASGI (posts.uploads.BodySizeLimitMiddleware)
 FILE_UPLOAD_HANDLERS = [
-    'django.core.files.uploadhandler.MemoryFileUploadHandler',
-    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+    'posts.uploads.HashingFileUploadHandler',
 ]
-# 10GB in bytes (10 * 1024 * 1024 * 1024)
-DATA_UPLOAD_MAX_MEMORY_SIZE = 10737418240  
-FILE_UPLOAD_MAX_MEMORY_SIZE = 10737418240
+# Non-file request data held in memory (bulk post imports need more than the 2.5MB default)
+DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024
 # Use chunk size of 2.5MB for better memory management
 FILE_UPLOAD_CHUNK_SIZE = 2621440
+# Where chunks of resumable uploads wait until the upload is finalized
+UPLOAD_SESSION_ROOT = os.getenv('UPLOAD_SESSION_ROOT', os.path.join(BASE_DIR, 'upload_sessions'))
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
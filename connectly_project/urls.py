@@ -5,10 +5,10 @@ The `urlpatterns` list routes URLs to views. For more information please see:
     https://docs.djangoproject.com/en/5.1/topics/http/urls/
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
 from posts.views import APIDocsView, login_view, home_view, logout_view
+from posts.media_serving import serve_media
 from posts.social_auth import GoogleOAuth2LoginView, OAuthCompleteView
 
 urlpatterns = [
@@ -29,5 +29,8 @@ urlpatterns = [
     path('oauth/complete/', OAuthCompleteView.as_view(), name='oauth_complete'),  # Callback endpoint
 ]
 
-# Serve media files in both development and production
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Serve media files in both development and production, with byte ranges and
+# cache validators (or offloaded to the proxy, see MEDIA_ACCEL)
+urlpatterns += [
+    re_path(r'^%s(?P<path>.+)$' % settings.MEDIA_URL.lstrip('/'), serve_media, name='media'),
+]
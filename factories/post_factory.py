@@ -1,5 +1,8 @@
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from posts.models import Post
+from posts.ranking import score_new_post
+from posts.signals import announce_new_posts
 from singletons.config_manager import ConfigManager
 from singletons.logger_singleton import LoggerSingleton
 
@@ -10,7 +13,6 @@ class PostFactory:
         Factory method to create different types of posts with proper validation
         """
         logger = LoggerSingleton().get_logger()
-        config = ConfigManager()
 
         # Initialize metadata if None
         metadata = metadata or {}
@@ -21,37 +23,23 @@ class PostFactory:
                 raise ValidationError(f"Invalid post type. Allowed types: {', '.join(dict(Post.POST_TYPES).keys())}")
 
             # Validate media requirements based on post type
-            if post_type in ['image', 'video']:
-                if not media:
-                    raise ValidationError(f"{post_type.capitalize()} post requires a media file")
-                
-                max_size = config.get_setting('MAX_FILE_SIZE', 10485760)  # Default 10MB
-                if hasattr(media, 'size') and media.size > max_size:
-                    raise ValidationError(f"File size exceeds maximum limit of {max_size/1024/1024:.1f}MB")
-
-                # Update metadata with file info
-                metadata.update({
-                    'file_size': media.size if hasattr(media, 'size') else 0,
-                    'file_type': media.name.split('.')[-1].lower() if hasattr(media, 'name') else ''
-                })
-
-            # Create and validate the post
+            if post_type in ['image', 'video'] and not media:
+                raise ValidationError(f"{post_type.capitalize()} post requires a media file")
+
+            # Media is assigned up front; Post.clean() checks its size and type
+            # and records it in metadata, so the row is validated and written once
             post = Post(
                 title=title,
                 content=content,
                 author=author,
                 post_type=post_type,
-                metadata=metadata
+                metadata=metadata,
+                media=media
             )
             
             # This will run all model validations
             post.full_clean()
-            post.save()
-
-            # Save media after post is created
-            if media:
-                post.media = media
-                post.save()
+            post.save(validate=False)
 
             logger.info(f"Created {post_type} post: {post.id} by {author.username}")
             return post
@@ -63,6 +51,52 @@ class PostFactory:
             logger.error(f"Unexpected error in post creation: {str(e)}")
             raise ValidationError(f"Post creation failed: {str(e)}")
 
+    # No media: files are uploaded through the single-post endpoints, whose
+    # post_save tracks their blob references (bulk_create sends no post_save)
+    BULK_FIELDS = ('title', 'content', 'post_type', 'metadata')
+
+    @staticmethod
+    def create_posts(author, items):
+        """
+        Batch counterpart of create_post for seeding and imports.
+
+        Each item is a dict of post fields (title, content, post_type, metadata).
+        Every item is validated once; invalid ones are reported and
+        skipped while the rest are inserted with bulk_create in chunks and
+        fanned out to timelines, caches and event streams once for the batch.
+        Returns (posts, errors) where errors is a list of {'index', 'errors'}.
+        """
+        logger = LoggerSingleton().get_logger()
+        config = ConfigManager()
+
+        posts, errors = [], []
+        for index, item in enumerate(items):
+            try:
+                if not isinstance(item, dict):
+                    raise ValidationError('Each post must be an object')
+                unknown = set(item) - set(PostFactory.BULK_FIELDS)
+                if unknown:
+                    raise ValidationError(f"Unknown fields: {', '.join(sorted(unknown))}")
+
+                post = Post(author=author, **item)
+                # The author is trusted, which skips a lookup per item. clean() assumes
+                # well-formed values, so field errors are reported before it runs
+                post.clean_fields(exclude=['author'])
+                post.clean()
+                score_new_post(post)
+                posts.append(post)
+            except ValidationError as e:
+                errors.append({'index': index, 'errors': e.messages})
+
+        if posts:
+            with transaction.atomic():
+                Post.objects.bulk_create(posts, batch_size=config.get_setting('BULK_CREATE_BATCH_SIZE'))
+                # post_save does not fire for bulk_create
+                announce_new_posts(posts)
+
+        logger.info(f"Bulk created {len(posts)} posts by {author.username} ({len(errors)} rejected)")
+        return posts, errors
+
     @staticmethod
     def create_text_post(author, title, content):
         """Convenience method for creating text posts"""
@@ -6,15 +6,16 @@ class PostAdmin(admin.ModelAdmin):
     list_display = ('author', 'content_preview', 'comment_count', 'created_at')
     list_filter = ('created_at', 'author')
     search_fields = ('content', 'author__username')
-    readonly_fields = ('created_at',)
+    readonly_fields = ('created_at', 'like_count', 'comment_count')
 
     def content_preview(self, obj):
         return obj.content[:50] + '...' if len(obj.content) > 50 else obj.content
     content_preview.short_description = 'Content'
 
     def comment_count(self, obj):
-        return obj.comments.count()
+        return obj.comment_count
     comment_count.short_description = 'Comments'
+    comment_count.admin_order_field = 'comment_count'
 
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
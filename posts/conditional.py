@@ -0,0 +1,38 @@
+import hashlib
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+
+def make_etag(*parts):
+    """Strong ETag from the values a representation is built from"""
+    return '"%s"' % hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+def _timestamp(last_modified):
+    return int(last_modified.timestamp()) if last_modified else None
+
+
+def not_modified(request, etag=None, last_modified=None):
+    """
+    Return a 304 response when the client's If-None-Match/If-Modified-Since
+    validators still match, so the caller can skip serialization; else None.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    response = get_conditional_response(
+        request, etag=etag, last_modified=_timestamp(last_modified)
+    )
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag=None, last_modified=None):
+    """Attach validators and make caches revalidate per user before reuse"""
+    if etag:
+        response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(_timestamp(last_modified))
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ('Authorization', 'Cookie'))
+    return response
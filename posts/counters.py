@@ -0,0 +1,93 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from .models import Comment, Like, Post, UserFollow, UserProfile
+
+RECONCILE_BATCH_SIZE = 1000
+
+POST_COUNTERS = {
+    'like_count': (Like, 'post'),
+    'comment_count': (Comment, 'post'),
+}
+
+# Profiles are keyed by user, so their counts match related rows on user_id
+PROFILE_COUNTERS = {
+    'posts_count': (Post, 'author', 'user_id'),
+    'followers_count': (UserFollow, 'followed', 'user_id'),
+    'following_count': (UserFollow, 'follower', 'user_id'),
+}
+
+
+def _shifted(field, delta):
+    """F() expression moving a counter by delta without letting it go negative"""
+    if delta >= 0:
+        return F(field) + delta
+    return Greatest(F(field) + delta, Value(0))
+
+
+def _adjust(queryset, updates, deltas):
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return 0
+    return queryset.update(
+        **{field: _shifted(field, delta) for field, delta in deltas.items()},
+        **(updates or {})
+    )
+
+
+def adjust_counters(model, pk, updates=None, **deltas):
+    """Atomically shift denormalized counters on a single row, applying any extra updates"""
+    return _adjust(model.objects.filter(pk=pk), updates, deltas)
+
+
+def adjust_post_counters(post_id, like_count=0, comment_count=0):
+    """Shift a post's like/comment counters, flag its score for refresh and stamp the activity"""
+    return adjust_counters(Post, post_id, updates={'score_dirty': True, 'activity_at': timezone.now()},
+                           like_count=like_count, comment_count=comment_count)
+
+
+def adjust_profile_counters(user_id, posts_count=0, followers_count=0, following_count=0):
+    """Shift the posts/followers/following counters on a user's profile"""
+    return _adjust(UserProfile.objects.filter(user_id=user_id), None, {
+        'posts_count': posts_count, 'followers_count': followers_count, 'following_count': following_count
+    })
+
+
+def _actual_count(related_model, related_field, outer_field='pk'):
+    counts = related_model.objects.filter(**{related_field: OuterRef(outer_field)})\
+        .order_by()\
+        .values(related_field)\
+        .annotate(total=Count('pk'))\
+        .values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def reconcile_counters(queryset, counters, updates=None):
+    """Recompute denormalized counters in bulk; returns the number of rows that drifted"""
+    actual = {f'actual_{field}': _actual_count(*source) for field, source in counters.items()}
+    drift = Q()
+    for field in counters:
+        drift |= ~Q(**{field: F(f'actual_{field}')})
+
+    drifted_ids = list(queryset.annotate(**actual).filter(drift).values_list('pk', flat=True))
+    for start in range(0, len(drifted_ids), RECONCILE_BATCH_SIZE):
+        queryset.model.objects.filter(pk__in=drifted_ids[start:start + RECONCILE_BATCH_SIZE]).update(
+            **{field: _actual_count(*source) for field, source in counters.items()},
+            **(updates or {})
+        )
+    return len(drifted_ids)
+
+
+def reconcile_post_counters(queryset=None):
+    """Recompute like/comment counters on posts from the Like and Comment tables"""
+    if queryset is None:
+        queryset = Post.objects.all()
+    return reconcile_counters(queryset, POST_COUNTERS,
+                              updates={'score_dirty': True, 'activity_at': timezone.now()})
+
+
+def reconcile_profile_counters(queryset=None):
+    """Recompute posts/followers/following counters on profiles from the Post and UserFollow tables"""
+    if queryset is None:
+        queryset = UserProfile.objects.all()
+    return reconcile_counters(queryset, PROFILE_COUNTERS)
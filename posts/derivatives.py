@@ -0,0 +1,141 @@
+"""
+Responsive derivatives of uploaded images.
+
+Image blobs are created with ``derivatives=None`` (pending). The
+generate_derivatives command picks pending blobs in batches and renders,
+on a thread pool, fixed-width versions in WebP plus JPEG (PNG when the
+image has transparency). Pillow releases the GIL while decoding, resizing
+and encoding, so threads scale. Workers only touch files; the results are
+recorded on MediaBlob.derivatives from the calling thread, and the posts
+and profiles showing those images get a new updated_at (and cached feed
+pages are dropped) so conditional GETs see the changed srcsets. Serializers
+turn the record into srcset strings, using the original until it is ready.
+"""
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from django.core.files.base import ContentFile
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+from . import feed_cache
+from .models import MediaBlob, Post, UserProfile
+from .storage import derivative_storage, is_blob, media_storage
+
+DERIVATIVE_WIDTHS = (320, 640, 1080)
+SAVE_OPTIONS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+    'png': {'format': 'PNG', 'optimize': True},
+}
+
+
+def is_image(name):
+    return bool(name) and os.path.splitext(name)[1].lower() in Post.IMAGE_EXTENSIONS
+
+
+def derivative_name(blob_name, width, fmt):
+    digest = os.path.splitext(os.path.basename(blob_name))[0]
+    return f'derivatives/{digest[:2]}/{digest}/{width}w.{fmt}'
+
+
+def render(blob_name):
+    """Write the derivatives of one image blob and return its record; {} if it cannot be decoded"""
+    try:
+        with media_storage.open(blob_name, 'rb') as source:
+            image = ImageOps.exif_transpose(Image.open(source))
+            image.load()
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return {}
+
+    width, height = image.size
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+    fallback = 'png' if has_alpha else 'jpeg'
+
+    variants = []
+    for target in sorted({min(target, width) for target in DERIVATIVE_WIDTHS}):
+        resized = image if target == width else image.resize(
+            (target, max(1, round(height * target / width))), Image.LANCZOS
+        )
+        for fmt in ('webp', fallback):
+            buffer = io.BytesIO()
+            resized.save(buffer, **SAVE_OPTIONS[fmt])
+            name = derivative_name(blob_name, target, fmt)
+            if derivative_storage.exists(name):
+                derivative_storage.delete(name)
+            derivative_storage.save(name, ContentFile(buffer.getvalue()))
+            variants.append({'width': target, 'format': fmt, 'name': name})
+    return {'width': width, 'height': height, 'variants': variants}
+
+
+def process_pending(batch_size=50, workers=4):
+    """Render derivatives for up to batch_size pending blobs; returns how many were processed"""
+    names = list(
+        MediaBlob.objects.filter(derivatives__isnull=True)
+        .order_by('created_at')
+        .values_list('name', flat=True)[:batch_size]
+    )
+    if not names:
+        return 0
+    images = [name for name in names if is_image(name)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        records = dict(zip(images, pool.map(render, images)))
+    for name in names:
+        MediaBlob.objects.filter(pk=name).update(derivatives=records.get(name, {}))
+    touch_owners([name for name, record in records.items() if record.get('variants')])
+    return len(names)
+
+
+def touch_owners(names):
+    """Move the validators of the posts and profiles showing these images, whose srcsets changed"""
+    if not names:
+        return
+    now = timezone.now()
+    post_ids = list(Post.objects.filter(media__in=names).values_list('pk', flat=True))
+    Post.objects.filter(pk__in=post_ids).update(updated_at=now)
+    UserProfile.objects.filter(Q(avatar__in=names) | Q(cover_photo__in=names)).update(updated_at=now)
+    for post_id in post_ids:
+        feed_cache.invalidate_post(post_id)
+
+
+def delete_files(record):
+    for variant in (record or {}).get('variants', ()):
+        derivative_storage.delete(variant['name'])
+
+
+def records_for(names):
+    """Derivative records of the given image blobs, in one query"""
+    names = [name for name in names if is_blob(name) and is_image(name)]
+    if not names:
+        return {}
+    return dict(MediaBlob.objects.filter(pk__in=names).values_list('name', 'derivatives'))
+
+
+def thumbnail(request, field_file, record):
+    """URL of the smallest widely supported rendition of an image, the original while pending"""
+    if not field_file or not is_image(field_file.name):
+        return None
+    variants = [variant for variant in (record or {}).get('variants', ()) if variant['format'] != 'webp']
+    if not variants:
+        return request.build_absolute_uri(field_file.url)
+    smallest = min(variants, key=lambda variant: variant['width'])
+    return request.build_absolute_uri(derivative_storage.url(smallest['name']))
+
+
+def srcset(request, field_file, record):
+    """
+    ``{'image/webp': ..., 'default': ...}`` srcset strings for an image, or just
+    the original under ``default`` while its derivatives are pending.
+    """
+    if not field_file or not is_image(field_file.name):
+        return None
+    if not record or not record.get('variants'):
+        return {'default': request.build_absolute_uri(field_file.url)}
+
+    sources = {}
+    for variant in record['variants']:
+        key = 'image/webp' if variant['format'] == 'webp' else 'default'
+        url = request.build_absolute_uri(derivative_storage.url(variant['name']))
+        sources.setdefault(key, []).append(f"{url} {variant['width']}w")
+    return {key: ', '.join(items) for key, items in sources.items()}
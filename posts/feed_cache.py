@@ -0,0 +1,155 @@
+"""
+Cache of serialized news feed pages, built on Django's cache framework.
+
+Page keys embed a per-user version (plus a global one for the unfiltered
+feed). Invalidation bumps versions instead of deleting keys: a user's
+version moves when their follows, likes or followed timeline change, the
+global one when posts are created or deleted. Each post has a version too,
+bumped by likes, comments and edits: a cached page stores the versions of
+its posts and is only served while they all still match.
+"""
+import hashlib
+import time
+from django.core.cache import cache
+from django.db import transaction
+from singletons.config_manager import ConfigManager
+
+KEY_PREFIX = 'feed'
+IGNORED_PARAMS = {'_'}
+USER_SCOPED_PARAMS = ('followed', 'liked')
+
+
+def _timeout():
+    return ConfigManager().get_setting('FEED_CACHE_TIMEOUT')
+
+
+def _user_version_key(user_id):
+    return f'{KEY_PREFIX}:user:{user_id}:version'
+
+
+def _global_version_key():
+    return f'{KEY_PREFIX}:global:version'
+
+
+def _post_version_key(post_id):
+    return f'{KEY_PREFIX}:post:{post_id}:version'
+
+
+def _stat_key(name):
+    return f'{KEY_PREFIX}:stats:{name}'
+
+
+def _fresh_version():
+    # Time based so a version evicted from the cache never reuses an old number
+    return int(time.time() * 1000)
+
+
+def _versions(keys):
+    versions = cache.get_many(keys)
+    missing = {key: _fresh_version() for key in keys if key not in versions}
+    if missing:
+        for key, value in missing.items():
+            cache.add(key, value, None)
+        versions.update(cache.get_many(list(missing)))
+    return [versions.get(key, 0) for key in keys]
+
+
+def _bump(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _fresh_version(), None)
+
+
+def _count(name):
+    key = _stat_key(name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def page_key(request):
+    """Cache key for the feed page this request asks for"""
+    params = sorted(
+        (name, value)
+        for name, values in request.query_params.lists()
+        if name not in IGNORED_PARAMS
+        for value in values
+    )
+    scoped_to_user = any(
+        request.query_params.get(name, 'false').lower() == 'true'
+        for name in USER_SCOPED_PARAMS
+    )
+    keys = [_user_version_key(request.user.id)]
+    if not scoped_to_user:
+        keys.append(_global_version_key())
+    versions = _versions(keys)
+
+    fingerprint = hashlib.sha1(repr((request.get_host(), params)).encode('utf-8')).hexdigest()
+    version_tag = '.'.join(str(version) for version in versions)
+    return f'{KEY_PREFIX}:page:{request.user.id}:{version_tag}:{fingerprint}'
+
+
+def user_version(user_id):
+    """Current version of everything the user sees personally (follows, likes, timeline)"""
+    return _versions([_user_version_key(user_id)])[0]
+
+
+def _post_versions(data):
+    post_ids = [post['id'] for post in data.get('results', []) if 'id' in post]
+    return dict(zip(post_ids, _versions([_post_version_key(post_id) for post_id in post_ids])))
+
+
+def get_page(key):
+    """
+    Return ``(data, post_versions)`` for a cached page whose posts are all
+    unchanged since it was stored, else None; counts the hit or miss
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        data, versions = entry
+        if _post_versions(data) != versions:
+            entry = None
+    _count('hits' if entry is not None else 'misses')
+    return entry
+
+
+def store_page(key, data):
+    """Cache page data along with its posts' versions, which are returned"""
+    versions = _post_versions(data)
+    cache.set(key, (data, versions), _timeout())
+    return versions
+
+
+def stats():
+    """Hit/miss counters for feed pages, shared by every process using the cache"""
+    counts = cache.get_many([_stat_key('hits'), _stat_key('misses')])
+    hits = counts.get(_stat_key('hits'), 0)
+    misses = counts.get(_stat_key('misses'), 0)
+    lookups = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / lookups, 4) if lookups else 0.0,
+    }
+
+
+def invalidate_users(user_ids):
+    """Drop every cached feed page of the given users once the transaction commits"""
+    keys = [_user_version_key(user_id) for user_id in set(user_ids)]
+    if keys:
+        transaction.on_commit(lambda: _bump(keys))
+
+
+def invalidate_post(post_id, extra_user_ids=()):
+    """Drop cached pages that contain the post, plus the extra users' pages"""
+    keys = [_post_version_key(post_id)] + [_user_version_key(user_id) for user_id in set(extra_user_ids)]
+    transaction.on_commit(lambda: _bump(keys))
+
+
+def invalidate_all_posts():
+    """Drop every cached unfiltered feed page, e.g. after a post is created or deleted"""
+    transaction.on_commit(lambda: _bump([_global_version_key()]))
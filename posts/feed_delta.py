@@ -0,0 +1,81 @@
+import base64
+import binascii
+import json
+from datetime import timedelta
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from singletons.config_manager import ConfigManager
+from .models import Post
+
+MAX_HELD_IDS = 200
+MAX_NEW_POSTS = 100
+
+
+def encode_token(last_post_id, checked_at):
+    payload = json.dumps({'p': last_post_id, 't': checked_at.isoformat()}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_token(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        last_post_id = int(payload['p'])
+        checked_at = parse_datetime(payload['t'])
+    except (TypeError, ValueError, KeyError, UnicodeError, binascii.Error):
+        checked_at = None
+    if checked_at is None:
+        raise ValidationError({'since': 'Invalid token'})
+    return last_post_id, checked_at
+
+
+def current_token():
+    """Token describing the feed as of now, handed out with the first feed page"""
+    last_post_id = Post.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    return encode_token(last_post_id, timezone.now())
+
+
+def parse_held_ids(raw):
+    if not raw:
+        return []
+    try:
+        ids = [int(value) for value in raw.split(',') if value]
+    except ValueError:
+        raise ValidationError({'ids': 'Expected a comma separated list of post ids'})
+    return ids[:MAX_HELD_IDS]
+
+
+def changes_since(feed_queryset, token, held_ids):
+    """
+    Fetch, in a single query, posts of the feed created after the token plus
+    held posts whose counters moved since it. Returns (new_posts, updated, next_token).
+
+    Ids and timestamps are assigned before their transaction commits, so a row
+    can become visible after a token past it was issued. The token's time is
+    moved back by FEED_DELTA_OVERLAP to pick such rows up on the next poll;
+    posts and counters within the overlap may be sent twice.
+    """
+    last_post_id, checked_at = decode_token(token)
+    now = timezone.now()
+    since = checked_at - timedelta(seconds=ConfigManager().get_setting('FEED_DELTA_OVERLAP'))
+
+    new_in_feed = feed_queryset.filter(Q(id__gt=last_post_id) | Q(created_at__gt=since)).order_by().values('pk')
+    condition = Q(pk__in=new_in_feed)
+    if held_ids:
+        condition |= Q(pk__in=held_ids, activity_at__gt=since)
+
+    rows = list(
+        Post.objects.filter(condition)
+        .select_related('author')
+        .order_by('id')[:MAX_NEW_POSTS + len(held_ids)]
+    )
+
+    held = set(held_ids)
+    new_posts = [post for post in rows if post.pk not in held][:MAX_NEW_POSTS]
+    updated = [post for post in rows if post.pk in held]
+    if new_posts:
+        last_post_id = max(last_post_id, new_posts[-1].pk)
+    new_posts.reverse()
+    return new_posts, updated, encode_token(last_post_id, now)
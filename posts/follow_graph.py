@@ -0,0 +1,203 @@
+"""
+In-process follow-graph index for "who to follow" suggestions.
+
+The graph is held as two CSR (compressed sparse row) adjacency structures
+over integer arrays: ``offsets[user_id]:offsets[user_id + 1]`` slices the
+sorted followed ids (following) or follower ids (followers) of a user. User
+ids are auto-increment, so they index the offsets directly. The index is
+built from UserFollow in one ordered pass and follows/unfollows committed
+in this process are layered on top as per-user added/removed sets. Each
+worker rebuilds its copy in a background thread once it is older than
+FOLLOW_GRAPH_TTL seconds (picking up other workers' changes) or the overlay
+exceeds FOLLOW_GRAPH_MAX_OVERLAY edges.
+
+Suggestions count, for every account followed by the people a user follows,
+how many of them follow it ("mutual" follows) and rank by that count, then
+by follower count.
+"""
+import heapq
+import threading
+import time
+from array import array
+from collections import Counter
+from django.db import connection
+from .models import UserFollow
+from singletons.config_manager import ConfigManager
+from singletons.logger_singleton import LoggerSingleton
+
+EDGE_CHUNK_SIZE = 10000
+
+
+def _csr(keys, values, size):
+    """Offsets and values grouped by key (a stable counting sort)"""
+    offsets = array('q', bytes(8 * (size + 1)))
+    for key in keys:
+        offsets[key + 1] += 1
+    for index in range(1, size + 1):
+        offsets[index] += offsets[index - 1]
+    grouped = array('q', bytes(8 * len(values)))
+    position = array('q', offsets)
+    for key, value in zip(keys, values):
+        grouped[position[key]] = value
+        position[key] += 1
+    return offsets, grouped
+
+
+class FollowGraph:
+    def __init__(self, followers, followed):
+        """``followers``/``followed`` are parallel integer arrays, one edge per position"""
+        size = max(max(followers, default=0), max(followed, default=0)) + 1
+        self.size = size
+        self.edge_count = len(followers)
+        self.following_offsets, self.following_ids = _csr(followers, followed, size)
+        self.follower_offsets, self.follower_ids = _csr(followed, followers, size)
+        self.built_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._added = {}
+        self._removed = {}
+        self._added_followers = {}
+        self._removed_followers = {}
+        self.overlay_size = 0
+
+    @classmethod
+    def from_database(cls):
+        followers, followed = array('q'), array('q')
+        edges = UserFollow.objects.order_by('follower_id', 'followed_id')\
+            .values_list('follower_id', 'followed_id')\
+            .iterator(chunk_size=EDGE_CHUNK_SIZE)
+        for follower_id, followed_id in edges:
+            followers.append(follower_id)
+            followed.append(followed_id)
+        return cls(followers, followed)
+
+    def _neighbours(self, offsets, ids, added, removed, user_id):
+        if 0 <= user_id < self.size:
+            base = ids[offsets[user_id]:offsets[user_id + 1]]
+        else:
+            base = ()
+        plus, minus = added.get(user_id), removed.get(user_id)
+        if not plus and not minus:
+            return base
+        return (set(base) | (plus or set())) - (minus or set())
+
+    def following(self, user_id):
+        return self._neighbours(self.following_offsets, self.following_ids,
+                                self._added, self._removed, user_id)
+
+    def followers(self, user_id):
+        return self._neighbours(self.follower_offsets, self.follower_ids,
+                                self._added_followers, self._removed_followers, user_id)
+
+    def follower_count(self, user_id):
+        if user_id in self._added_followers or user_id in self._removed_followers:
+            return len(self.followers(user_id))
+        if 0 <= user_id < self.size:
+            return self.follower_offsets[user_id + 1] - self.follower_offsets[user_id]
+        return 0
+
+    def _move(self, add_to, take_from, key, value):
+        take_from.get(key, set()).discard(value)
+        add_to.setdefault(key, set()).add(value)
+
+    def add_edge(self, follower_id, followed_id):
+        with self._lock:
+            self._move(self._added, self._removed, follower_id, followed_id)
+            self._move(self._added_followers, self._removed_followers, followed_id, follower_id)
+            self.overlay_size += 1
+
+    def remove_edge(self, follower_id, followed_id):
+        with self._lock:
+            self._move(self._removed, self._added, follower_id, followed_id)
+            self._move(self._removed_followers, self._added_followers, followed_id, follower_id)
+            self.overlay_size += 1
+
+    def suggestions(self, user_id, limit):
+        """``[(user_id, mutual_count)]`` of accounts the user's follows follow, best first"""
+        following = self.following(user_id)
+        mutual = Counter()
+        for followed_id in following:
+            mutual.update(self.following(followed_id))
+        for excluded in (user_id, *following):
+            mutual.pop(excluded, None)
+        return heapq.nsmallest(
+            limit, mutual.items(),
+            key=lambda item: (-item[1], -self.follower_count(item[0]), item[0])
+        )
+
+
+class _Index:
+    """The current graph of this process, rebuilt in the background when stale"""
+
+    def __init__(self):
+        self.graph = None
+        self._lock = threading.Lock()
+        self._rebuilding = False
+        self._replay = None
+
+    def get(self):
+        graph = self.graph
+        if graph is None:
+            with self._lock:
+                if self.graph is None:
+                    self.graph = FollowGraph.from_database()
+                return self.graph
+        if self._stale(graph):
+            self._rebuild_in_background()
+        return graph
+
+    def _stale(self, graph):
+        config = ConfigManager()
+        return (time.monotonic() - graph.built_at > config.get_setting('FOLLOW_GRAPH_TTL')
+                or graph.overlay_size > config.get_setting('FOLLOW_GRAPH_MAX_OVERLAY'))
+
+    def _rebuild_in_background(self):
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+            self._replay = []
+        threading.Thread(target=self._rebuild, name='follow-graph-rebuild', daemon=True).start()
+
+    def _rebuild(self):
+        try:
+            graph = FollowGraph.from_database()
+            with self._lock:
+                # Changes committed while the snapshot was read; replaying is idempotent
+                for method, edge in self._replay:
+                    getattr(graph, method)(*edge)
+                self.graph = graph
+        except Exception as e:
+            LoggerSingleton().get_logger().error(f'Rebuilding the follow graph failed: {e}')
+        finally:
+            with self._lock:
+                self._rebuilding, self._replay = False, None
+            connection.close()
+
+    def apply(self, method, follower_id, followed_id):
+        with self._lock:
+            if self.graph is None:
+                return
+            getattr(self.graph, method)(follower_id, followed_id)
+            if self._replay is not None:
+                self._replay.append((method, (follower_id, followed_id)))
+
+    def reset(self):
+        with self._lock:
+            self.graph = None
+
+
+index = _Index()
+
+
+def follow_added(follower_id, followed_id):
+    index.apply('add_edge', follower_id, followed_id)
+
+
+def follow_removed(follower_id, followed_id):
+    index.apply('remove_edge', follower_id, followed_id)
+
+
+def suggestions(user_id, limit=None):
+    if limit is None:
+        limit = ConfigManager().get_setting('FOLLOW_SUGGESTION_COUNT')
+    return index.get().suggestions(user_id, limit)
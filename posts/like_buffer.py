@@ -0,0 +1,119 @@
+"""
+Write-behind like counts for viral posts.
+
+With LIKE_COUNT_WRITE_BEHIND enabled, like and unlike still write their Like
+row synchronously, but the Post.like_count change is merged into an
+in-process buffer once the row commits instead of updating the hot Post row
+every time. The buffer is flushed in one transaction, one UPDATE per post,
+every LIKE_FLUSH_INTERVAL seconds from a background thread, as soon as
+LIKE_FLUSH_THRESHOLD events are pending, and when the worker exits. Counts
+served by this worker add its pending delta to the stored one; other workers
+catch up at the next flush.
+
+Like rows remain the source of truth: after a worker dies without flushing,
+run ``manage.py reconcile_counters`` (before serving traffic again, since
+live workers' pending deltas would be counted twice) to rebuild like_count.
+"""
+import atexit
+import threading
+from collections import Counter
+from django.conf import settings
+from django.db import connection, transaction
+from .counters import adjust_post_counters
+from singletons.config_manager import ConfigManager
+from singletons.logger_singleton import LoggerSingleton
+
+
+class LikeCountBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._deltas = Counter()
+        self._flushing = Counter()
+        self._events = 0
+        self._flusher = None
+        self._stopped = threading.Event()
+
+    def add(self, post_id, delta):
+        with self._lock:
+            self._deltas[post_id] += delta
+            self._events += 1
+            full = self._events >= ConfigManager().get_setting('LIKE_FLUSH_THRESHOLD')
+        self._start_flusher()
+        if full:
+            self.flush()
+
+    def pending(self, post_id):
+        """Delta not yet written to the post, including a batch being flushed right now"""
+        with self._lock:
+            return self._deltas.get(post_id, 0) + self._flushing.get(post_id, 0)
+
+    def flush(self):
+        """Write the merged deltas; returns how many posts were updated"""
+        with self._flush_lock:
+            with self._lock:
+                batch = {post_id: delta for post_id, delta in self._deltas.items() if delta}
+                self._flushing, self._deltas, self._events = self._deltas, Counter(), 0
+            if not batch:
+                self._flushing = Counter()
+                return 0
+            try:
+                with transaction.atomic():
+                    # Fixed order so concurrent flushes from other workers cannot deadlock
+                    for post_id in sorted(batch):
+                        adjust_post_counters(post_id, like_count=batch[post_id])
+            except Exception:
+                with self._lock:
+                    self._deltas.update(self._flushing)
+                raise
+            finally:
+                with self._lock:
+                    self._flushing = Counter()
+            return len(batch)
+
+    def _start_flusher(self):
+        interval = ConfigManager().get_setting('LIKE_FLUSH_INTERVAL')
+        if self._flusher is not None or not interval:
+            return
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run, args=(interval,),
+                                                 name='like-count-flusher', daemon=True)
+                self._flusher.start()
+
+    def _run(self, interval):
+        while not self._stopped.wait(interval):
+            try:
+                self.flush()
+            except Exception as e:
+                LoggerSingleton().get_logger().error(f'Flushing like counts failed: {e}')
+            finally:
+                connection.close()
+
+    def shutdown(self):
+        """Stop the flusher and write what is left (registered with atexit)"""
+        self._stopped.set()
+        try:
+            self.flush()
+        except Exception as e:
+            LoggerSingleton().get_logger().error(f'Flushing like counts at exit failed: {e}')
+
+
+buffer = LikeCountBuffer()
+atexit.register(buffer.shutdown)
+
+
+def enabled():
+    return getattr(settings, 'LIKE_COUNT_WRITE_BEHIND', False)
+
+
+def adjust_like_count(post_id, delta):
+    """Move a post's like count now, or buffer the change until the like commits"""
+    if enabled():
+        transaction.on_commit(lambda: buffer.add(post_id, delta))
+    else:
+        adjust_post_counters(post_id, like_count=delta)
+
+
+def pending(post_id):
+    return buffer.pending(post_id) if enabled() else 0
@@ -0,0 +1,76 @@
+"""
+Idempotent like/unlike.
+
+PUT and DELETE on a post's like resource each run one conflict-tolerant
+statement (``INSERT ... ON CONFLICT DO NOTHING`` / ``DELETE``, both with
+``RETURNING``) so concurrent or repeated requests neither fail on the
+(user, post) unique constraint nor double count. Only a statement that
+actually changed a row moves the counter, in the same transaction, and the
+resulting count is returned. With write-behind like counts the counter
+change is buffered instead (see posts.like_buffer).
+"""
+from django.db import connection, transaction
+from django.utils import timezone
+from . import like_buffer
+from .models import Like, Post
+from .signals import like_added, like_removed
+
+
+def _names():
+    quote = connection.ops.quote_name
+    opts = Like._meta
+    return {
+        'like': quote(opts.db_table),
+        'post': quote(Post._meta.db_table),
+        'post_pk': quote(Post._meta.pk.column),
+        'user_id': quote(opts.get_field('user').column),
+        'post_id': quote(opts.get_field('post').column),
+        'created_at': quote(opts.get_field('created_at').column),
+    }
+
+
+def _insert(user_id, post_id):
+    """Insert the like unless it exists (or the post does not); True if a row was added"""
+    created_at = Like._meta.get_field('created_at').get_db_prep_value(timezone.now(), connection)
+    sql = (
+        'INSERT INTO {like} ({user_id}, {post_id}, {created_at}) '
+        'SELECT %s, {post_pk}, %s FROM {post} WHERE {post_pk} = %s '
+        'ON CONFLICT ({user_id}, {post_id}) DO NOTHING RETURNING 1'
+    ).format(**_names())
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [user_id, created_at, post_id])
+        return cursor.fetchone() is not None
+
+
+def _delete(user_id, post_id):
+    """Delete the like if present; True if a row was removed"""
+    sql = 'DELETE FROM {like} WHERE {user_id} = %s AND {post_id} = %s RETURNING 1'.format(**_names())
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [user_id, post_id])
+        return cursor.fetchone() is not None
+
+
+def like_count(post_id):
+    """The post's like count (with any buffered change), or None if the post does not exist"""
+    stored = Post.objects.filter(pk=post_id).values_list('like_count', flat=True).first()
+    if stored is None:
+        return None
+    return max(stored + like_buffer.pending(post_id), 0)
+
+
+def set_like(user_id, post_id, liked):
+    """
+    Make the user's like on the post match ``liked``; returns ``(changed, like_count)``
+    with like_count None when the post does not exist.
+    """
+    with transaction.atomic():
+        if liked:
+            changed = _insert(user_id, post_id)
+            if changed:
+                like_added(post_id, user_id)
+        else:
+            changed = _delete(user_id, post_id)
+            if changed:
+                like_removed(post_id, user_id)
+    # Read after commit so a write-behind change is already buffered
+    return changed, like_count(post_id)
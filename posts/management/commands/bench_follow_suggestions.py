@@ -0,0 +1,40 @@
+import random
+import statistics
+import time
+from array import array
+from django.core.management.base import BaseCommand
+from posts.follow_graph import FollowGraph
+
+
+class Command(BaseCommand):
+    help = 'Builds a synthetic in-memory follow graph and measures suggestion latency (no database access)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--edges', type=int, default=2000000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        users = options['users']
+        # Skewed popularity: a few accounts are followed by many
+        weights = [1 / (rank + 1) ** 0.8 for rank in range(users)]
+        followed = array('q', rng.choices(range(1, users + 1), weights=weights, k=options['edges']))
+        followers = array('q', (rng.randint(1, users) for _ in range(options['edges'])))
+
+        started = time.perf_counter()
+        graph = FollowGraph(followers, followed)
+        self.stdout.write(f'built {graph.edge_count} edges for {users} users in {time.perf_counter() - started:.2f}s')
+
+        timings = []
+        for _ in range(options['queries']):
+            user_id = rng.randint(1, users)
+            started = time.perf_counter()
+            graph.suggestions(user_id, 10)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        self.stdout.write(
+            f'suggestions: mean {statistics.mean(timings):.2f} ms  '
+            f'p95 {timings[int(len(timings) * 0.95) - 1]:.2f} ms  max {timings[-1]:.2f} ms'
+        )
@@ -0,0 +1,70 @@
+import shutil
+import statistics
+import tempfile
+import time
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment
+from rest_framework.test import APIClient
+from factories.post_factory import PostFactory
+
+# 1x1 transparent GIF
+IMAGE_BYTES = b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;'
+
+
+class Command(BaseCommand):
+    help = 'Measures queries and latency per post creation (API and PostFactory); all writes are rolled back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Posts created per scenario')
+
+    def handle(self, *args, **options):
+        media_root = tempfile.mkdtemp()
+        setup_test_environment()
+        try:
+            with override_settings(MEDIA_ROOT=media_root):
+                with transaction.atomic():
+                    self.run(options['requests'])
+                    transaction.set_rollback(True)
+        finally:
+            teardown_test_environment()
+            shutil.rmtree(media_root, ignore_errors=True)
+
+    def run(self, count):
+        author = User.objects.create_user(username='bench-post-create', password='bench-pass-123')
+        client = APIClient()
+        client.force_authenticate(author)
+
+        def api_text(i):
+            client.post('/api/posts/', {'title': f'bench {i}', 'content': 'text', 'post_type': 'text'},
+                        format='multipart')
+
+        def api_image(i):
+            client.post('/api/posts/', {
+                'title': f'bench {i}', 'content': 'image', 'post_type': 'image',
+                'media': SimpleUploadedFile(f'bench{i}.gif', IMAGE_BYTES, content_type='image/gif')
+            }, format='multipart')
+
+        def factory_image(i):
+            PostFactory.create_image_post(
+                author, f'bench {i}', 'image',
+                SimpleUploadedFile(f'bench{i}.gif', IMAGE_BYTES, content_type='image/gif')
+            )
+
+        for name, create in (('api text', api_text), ('api image', api_image), ('factory image', factory_image)):
+            queries, timings = [], []
+            for i in range(count):
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    create(i)
+                    timings.append((time.perf_counter() - started) * 1000)
+                queries.append(len(captured))
+
+            timings.sort()
+            self.stdout.write(
+                f'{name:>14}: {statistics.mean(queries):5.1f} queries/post  '
+                f'mean {statistics.mean(timings):6.2f} ms  '
+                f'p95 {timings[int(len(timings) * 0.95) - 1]:6.2f} ms'
+            )
@@ -0,0 +1,62 @@
+import statistics
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from rest_framework.request import Request
+from posts.models import Comment, Like, Post, UserFollow
+from posts.row_serializers import PostRowSerializer
+from posts.serializers import PostSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compares PostSerializer with the values()-based row serializer for feed pages; all writes are rolled back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10, 100], help='Page sizes to measure')
+        parser.add_argument('--repeat', type=int, default=50, help='Pages serialized per path and size')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.run(options['rows'], options['repeat'])
+            transaction.set_rollback(True)
+
+    def run(self, sizes, repeat):
+        viewer = User.objects.create_user(username='bench-serializers', password='bench-pass-123')
+        author = User.objects.create_user(username='bench-serializers-author', password='bench-pass-123')
+        UserFollow.objects.create(follower=viewer, followed=author)
+        posts = Post.objects.bulk_create([
+            Post(author=author, title=f'bench {i}', content='x' * 200, metadata={'i': i})
+            for i in range(max(sizes))
+        ])
+        Like.objects.bulk_create([Like(user=viewer, post=post) for post in posts[::2]])
+        Comment.objects.bulk_create([Comment(author=viewer, post=post, text='nice') for post in posts])
+
+        request = Request(RequestFactory().get('/api/feed/'))
+        request.user = viewer
+        queryset = Post.objects.filter(author=author).order_by('-created_at', '-id')
+
+        def drf(size):
+            page = list(PostSerializer.select_related(queryset, request)[:size])
+            return PostSerializer(page, many=True, context={'request': request}).data
+
+        def rows(size):
+            serializer = PostRowSerializer(request)
+            return serializer.serialize(serializer.values(queryset)[:size])
+
+        for size in sizes:
+            means = {}
+            for name, serialize in (('PostSerializer', drf), ('row serializer', rows)):
+                timings = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    serialize(size)
+                    timings.append((time.perf_counter() - started) * 1000)
+                timings.sort()
+                means[name] = statistics.mean(timings)
+                self.stdout.write(
+                    f'{size:>4} rows  {name:>14}: mean {means[name]:7.2f} ms  '
+                    f'p95 {timings[int(len(timings) * 0.95) - 1]:7.2f} ms'
+                )
+            self.stdout.write(f'{size:>4} rows  speedup {means["PostSerializer"] / means["row serializer"]:.1f}x')
@@ -0,0 +1,16 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from posts.resumable import discard_abandoned
+
+
+class Command(BaseCommand):
+    help = 'Deletes resumable upload sessions (and their chunks) that have not received data recently'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=int, default=None,
+                            help='Seconds of inactivity before a session is discarded (default UPLOAD_SESSION_TTL)')
+
+    def handle(self, *args, **options):
+        max_age = timedelta(seconds=options['max_age']) if options['max_age'] is not None else None
+        removed = discard_abandoned(max_age)
+        self.stdout.write(self.style.SUCCESS(f'Discarded {removed} abandoned upload session(s)'))
@@ -0,0 +1,31 @@
+import time
+from django.core.management.base import BaseCommand
+from posts import feed_cache
+from posts.derivatives import process_pending
+
+
+class Command(BaseCommand):
+    help = 'Renders thumbnails and WebP versions of newly uploaded images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Images claimed per batch')
+        parser.add_argument('--workers', type=int, default=4, help='Threads rendering images in parallel')
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Keep running, checking for new images every INTERVAL seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            total = 0
+            while True:
+                processed = process_pending(batch_size=options['batch_size'], workers=options['workers'])
+                total += processed
+                if not processed:
+                    break
+            if total:
+                # Cached feed pages still point at the originals
+                feed_cache.invalidate_all_posts()
+            self.stdout.write(self.style.SUCCESS(f'Generated derivatives for {total} file(s)'))
+
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
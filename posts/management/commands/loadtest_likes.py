@@ -0,0 +1,76 @@
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from rest_framework.test import APIClient
+from posts import like_buffer
+from posts.models import Like, Post
+
+USERNAME_PREFIX = 'loadtest-likes-'
+
+
+class Command(BaseCommand):
+    help = ('Hammers one post with concurrent, duplicated like/unlike requests and checks '
+            'that no update is lost and no request fails; the test data is deleted afterwards')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help='Distinct users liking the post')
+        parser.add_argument('--threads', type=int, default=16, help='Concurrent request threads')
+        parser.add_argument('--repeat', type=int, default=2, help='Times each request is sent (retries/double clicks)')
+
+    def handle(self, *args, **options):
+        User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+        User.objects.bulk_create([
+            User(username=f'{USERNAME_PREFIX}{i}') for i in range(options['users'])
+        ])
+        users = list(User.objects.filter(username__startswith=USERNAME_PREFIX))
+        post = Post.objects.create(author=users[0], title='hot post', content='like me')
+        setup_test_environment()
+        try:
+            failures = self.run(post, users, options['threads'], options['repeat'])
+        finally:
+            teardown_test_environment()
+            User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+        if failures:
+            raise CommandError(f'{failures} check(s) failed')
+        self.stdout.write(self.style.SUCCESS('No lost updates and no failed requests'))
+
+    def run(self, post, users, threads, repeat):
+        url = f'/api/posts/{post.pk}/like/'
+
+        def send(job):
+            user, method = job
+            client = APIClient()
+            client.force_authenticate(user)
+            try:
+                return getattr(client, method)(url).status_code
+            finally:
+                connection.close()
+
+        unliking = users[::2]
+        phases = (
+            ('like', [(user, 'put') for user in users], len(users)),
+            ('unlike', [(user, 'delete') for user in unliking], len(users) - len(unliking)),
+        )
+        failures = 0
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            for name, jobs, expected in phases:
+                jobs = jobs * repeat
+                started = time.perf_counter()
+                statuses = Counter(pool.map(send, jobs))
+                elapsed = time.perf_counter() - started
+                if like_buffer.enabled():
+                    like_buffer.buffer.flush()
+                stored = Post.objects.get(pk=post.pk).like_count
+                rows = Like.objects.filter(post=post).count()
+                ok = statuses == Counter({200: len(jobs)}) and stored == rows == expected
+                failures += not ok
+                self.stdout.write(
+                    f'{name:>6}: {len(jobs)} requests in {elapsed:.2f}s ({len(jobs) / elapsed:.0f}/s)  '
+                    f'statuses {dict(statuses)}  like_count {stored}  rows {rows}  expected {expected}  '
+                    + (self.style.SUCCESS('OK') if ok else self.style.ERROR('FAIL'))
+                )
+        return failures
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds materialized home timelines from existing follows and posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', type=str, help='Only rebuild timelines for these users')
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+
+        rebuilt = 0
+        for user_id in users.values_list('id', flat=True).iterator():
+            timeline.rebuild_timeline(user_id)
+            rebuilt += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt} timeline(s)'))
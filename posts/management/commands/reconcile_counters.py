@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from posts.counters import reconcile_post_counters, reconcile_profile_counters
+
+
+class Command(BaseCommand):
+    help = 'Recomputes denormalized post (like/comment) and profile (posts/followers/following) counters'
+
+    def handle(self, *args, **options):
+        fixed = reconcile_post_counters()
+        self.stdout.write(self.style.SUCCESS(f'Reconciled counters on {fixed} post(s)'))
+        fixed = reconcile_profile_counters()
+        self.stdout.write(self.style.SUCCESS(f'Reconciled counters on {fixed} profile(s)'))
@@ -0,0 +1,24 @@
+import time
+from django.core.management.base import BaseCommand
+from posts import feed_cache
+from posts.ranking import refresh_scores
+
+
+class Command(BaseCommand):
+    help = 'Recomputes "top" feed scores for posts whose like/comment counts changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Posts refreshed per transaction')
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Keep running, refreshing every INTERVAL seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            refreshed = refresh_scores(batch_size=options['batch_size'])
+            if refreshed:
+                feed_cache.invalidate_all_posts()
+            self.stdout.write(self.style.SUCCESS(f'Refreshed scores for {refreshed} post(s)'))
+
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,87 @@
+"""
+Reference counting for content-addressed media blobs.
+
+Post.media, UserProfile.avatar and UserProfile.cover_photo point at blobs
+written by ContentAddressedStorage. Each blob has a MediaBlob row whose
+ref_count follows how many of those fields name it; when a save or delete
+drops the count to zero the row and the file are removed after commit.
+Files stored before content addressing (outside ``blobs/``) are left alone.
+"""
+from django.db import transaction
+from . import derivatives
+from .counters import adjust_counters
+from .models import MediaBlob
+from .storage import is_blob, media_storage
+
+MEDIA_FIELDS = {
+    'Post': ('media',),
+    'UserProfile': ('avatar', 'cover_photo'),
+}
+
+
+def media_fields(instance):
+    return MEDIA_FIELDS.get(type(instance).__name__, ())
+
+
+def stored_names(instance):
+    """Blob names the instance references in the database, tracked since it was loaded or saved"""
+    return {name for name in getattr(instance, '_stored_blobs', {}).values() if name}
+
+
+def remember_names(instance):
+    """Record the instance's current blob name per media field without loading deferred fields"""
+    previous = getattr(instance, '_stored_blobs', {})
+    current = {}
+    for field in media_fields(instance):
+        if field not in instance.__dict__:
+            # Deferred, so this instance cannot have changed it
+            current[field] = previous.get(field)
+            continue
+        value = instance.__dict__[field]
+        name = getattr(value, 'name', value)
+        current[field] = name if is_blob(name) else None
+    instance._stored_blobs = current
+
+
+def acquire(names):
+    for name in names:
+        blob, created = MediaBlob.objects.get_or_create(
+            name=name, defaults={
+                'size': media_storage.size(name),
+                'ref_count': 1,
+                # Images wait for generate_derivatives; other media have none
+                'derivatives': None if derivatives.is_image(name) else {}
+            }
+        )
+        if not created:
+            adjust_counters(MediaBlob, name, ref_count=1)
+
+
+def release(names):
+    for name in names:
+        adjust_counters(MediaBlob, name, ref_count=-1)
+    if names:
+        transaction.on_commit(lambda: collect(names))
+
+
+def collect(names):
+    """Delete blobs among ``names`` (and their derivatives) that nothing references any more"""
+    for name in names:
+        record = MediaBlob.objects.filter(name=name, ref_count=0).values_list('derivatives', flat=True).first()
+        deleted, _ = MediaBlob.objects.filter(name=name, ref_count=0).delete()
+        if deleted:
+            media_storage.delete(name)
+            derivatives.delete_files(record)
+
+
+def track_save(instance):
+    old = stored_names(instance)
+    remember_names(instance)
+    new = stored_names(instance)
+    acquire(new - old)
+    release(old - new)
+
+
+def track_delete(instance):
+    release(stored_names(instance))
+    instance._stored_blobs = {}
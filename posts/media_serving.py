@@ -0,0 +1,183 @@
+"""
+Media file serving with byte ranges, validators and proxy offload.
+
+Content-addressed blobs and their derivatives never change under a given
+name, so they get a strong ETag (the hash) and immutable caching; other
+files are revalidated. Single ``Range: bytes=`` requests are answered with
+206 so video players can seek. With MEDIA_ACCEL set to ``x-accel``
+(nginx) or ``x-sendfile`` (Apache/lighttpd) the response only carries
+headers and the front proxy sends the bytes; other values are reported by a
+system check and the file is served from Python.
+
+Bodies are streamed in MEDIA_CHUNK_SIZE pieces: through the WSGI file
+wrapper (sendfile) for whole files under WSGI, and through an async
+iterator under ASGI, where Django would otherwise buffer a synchronous one.
+"""
+import asyncio
+import mimetypes
+import os
+import re
+from django.conf import settings
+from django.core import checks
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotAllowed, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from .conditional import make_etag
+from .storage import is_blob
+
+MEDIA_CHUNK_SIZE = 256 * 1024
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+ACCEL_MODES = ('x-accel', 'x-sendfile')
+
+
+class UnsatisfiableRange(Exception):
+    pass
+
+
+def check_media_accel(app_configs, **kwargs):
+    accel = getattr(settings, 'MEDIA_ACCEL', '')
+    if accel and accel not in ACCEL_MODES:
+        return [checks.Warning(
+            f'MEDIA_ACCEL={accel!r} is not one of {", ".join(ACCEL_MODES)}; media is served from Python.',
+            id='posts.W001',
+        )]
+    return []
+
+
+def is_immutable(name):
+    return is_blob(name) or name.startswith('derivatives/')
+
+
+def file_etag(name, stat):
+    if is_blob(name):
+        return '"%s"' % os.path.splitext(os.path.basename(name))[0]
+    return make_etag(name, stat.st_size, stat.st_mtime_ns)
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single satisfiable byte range, None to send everything"""
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or not any(match.groups()):
+        # Absent, malformed or multi-range requests get the whole file
+        return None
+    first, last = match.groups()
+    if not first:
+        length = int(last)
+        if length == 0:
+            raise UnsatisfiableRange
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise UnsatisfiableRange
+    return start, end
+
+
+def _read_chunks(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            data = f.read(min(MEDIA_CHUNK_SIZE, length))
+            if not data:
+                return
+            length -= len(data)
+            yield data
+
+
+async def _aread_chunks(path, start, length):
+    f = await asyncio.to_thread(open, path, 'rb')
+    try:
+        await asyncio.to_thread(f.seek, start)
+        while length > 0:
+            data = await asyncio.to_thread(f.read, min(MEDIA_CHUNK_SIZE, length))
+            if not data:
+                return
+            length -= len(data)
+            yield data
+    finally:
+        await asyncio.to_thread(f.close)
+
+
+def _body(request, path, start, length, whole):
+    if isinstance(request, ASGIRequest):
+        return StreamingHttpResponse(_aread_chunks(path, start, length))
+    if whole:
+        return FileResponse(open(path, 'rb'))
+    return StreamingHttpResponse(_read_chunks(path, start, length))
+
+
+def serve_media(request, path):
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        stat = os.stat(full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    size = stat.st_size
+    etag = file_etag(path, stat)
+    last_modified = int(stat.st_mtime)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(last_modified),
+        'Cache-Control': IMMUTABLE_CACHE_CONTROL if is_immutable(path) else 'public, no-cache',
+        'Accept-Ranges': 'bytes',
+    }
+
+    unchanged = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if unchanged is not None:
+        for header, value in headers.items():
+            unchanged[header] = value
+        return unchanged
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+
+    accel = getattr(settings, 'MEDIA_ACCEL', '')
+    if accel in ACCEL_MODES:
+        # The proxy handles ranges itself; hand it the file and keep our validators
+        response = HttpResponse(content_type=content_type)
+        if accel == 'x-accel':
+            response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + path
+        else:
+            response['X-Sendfile'] = full_path
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if if_range is None or if_range == etag:
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except UnsatisfiableRange:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1 if size else 0
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+    else:
+        response = _body(request, full_path, start, length, byte_range is None)
+        response['Content-Type'] = content_type
+    if byte_range:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = str(length)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    for header, value in headers.items():
+        response[header] = value
+    return response
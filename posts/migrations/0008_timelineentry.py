@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:29
+
+import heapq
+import django.db.models.deletion
+from itertools import groupby
+from django.conf import settings
+from django.db import migrations, models
+from singletons.config_manager import ConfigManager
+
+
+def backfill_timelines(apps, schema_editor):
+    """Materialize the timelines of existing follows, as rebuild_timelines does"""
+    Post = apps.get_model('posts', 'Post')
+    UserFollow = apps.get_model('posts', 'UserFollow')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    length = ConfigManager().get_setting('TIMELINE_MAX_LENGTH')
+
+    recent_posts = {}
+    follows = list(UserFollow.objects.order_by('follower_id').values_list('follower_id', 'followed_id'))
+    for follower_id, group in groupby(follows, key=lambda follow: follow[0]):
+        candidates = []
+        for _, followed_id in group:
+            if followed_id not in recent_posts:
+                recent_posts[followed_id] = list(
+                    Post.objects.filter(author_id=followed_id)
+                    .order_by('-created_at', '-id')
+                    .values_list('created_at', 'id')[:length]
+                )
+            candidates.extend(recent_posts[followed_id])
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user_id=follower_id, post_id=post_id, post_created_at=created_at)
+             for created_at, post_id in heapq.nlargest(length, candidates)],
+            batch_size=500
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_userprofile'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('post_created_at', models.DateTimeField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-post_created_at'], name='timeline_user_recent_idx')],
+                'unique_together': {('user', 'post')},
+            },
+        ),
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:37
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_post_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='activity_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
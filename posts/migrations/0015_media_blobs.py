@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:53
+
+import posts.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_uploadsession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('size', models.PositiveBigIntegerField()),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='media',
+            field=models.FileField(blank=True, null=True, storage=posts.storage.get_media_storage, upload_to='post_media/'),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='avatar',
+            field=models.ImageField(blank=True, null=True, storage=posts.storage.get_media_storage, upload_to='profile_avatars/'),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='cover_photo',
+            field=models.ImageField(blank=True, null=True, storage=posts.storage.get_media_storage, upload_to='profile_covers/'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_media_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediablob',
+            name='derivatives',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='mediablob',
+            index=models.Index(condition=models.Q(('derivatives__isnull', True)), fields=['created_at'], name='blob_derivatives_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:06
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    UserProfile = apps.get_model('posts', 'UserProfile')
+    Post = apps.get_model('posts', 'Post')
+    UserFollow = apps.get_model('posts', 'UserFollow')
+
+    def count_of(model, field):
+        counts = model.objects.filter(**{field: OuterRef('user_id')}).order_by().values(field)\
+            .annotate(total=Count('pk')).values('total')
+        return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+    UserProfile.objects.update(
+        posts_count=count_of(Post, 'author'),
+        followers_count=count_of(UserFollow, 'followed'),
+        following_count=count_of(UserFollow, 'follower'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_mediablob_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,13 @@
 import json
-from django.db import models
+import uuid
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
+from django.db import models, transaction
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
 from singletons.config_manager import ConfigManager
+from .storage import get_media_storage
 from django.core.files.uploadedfile import InMemoryUploadedFile
 
 class UserProfile(models.Model):
@@ -12,10 +15,14 @@ class UserProfile(models.Model):
     bio = models.TextField(max_length=500, blank=True)
     location = models.CharField(max_length=100, blank=True)
     website = models.URLField(max_length=200, blank=True)
-    avatar = models.ImageField(upload_to='profile_avatars/', null=True, blank=True)
-    cover_photo = models.ImageField(upload_to='profile_covers/', null=True, blank=True)
+    avatar = models.ImageField(upload_to='profile_avatars/', storage=get_media_storage, null=True, blank=True)
+    cover_photo = models.ImageField(upload_to='profile_covers/', storage=get_media_storage, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Denormalized counters, kept in step with Post/UserFollow writes (see posts.counters)
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return f"{self.user.username}'s profile"
@@ -26,11 +33,6 @@ def create_user_profile(sender, instance, created, **kwargs):
     if created:
         UserProfile.objects.create(user=instance)
 
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    """Save the UserProfile instance when the User is saved"""
-    instance.profile.save()
-
 
 class Post(models.Model):
     POST_TYPES = [
@@ -38,14 +40,38 @@ class Post(models.Model):
         ('image', 'Image Post'),
         ('video', 'Video Post'),
     ]
+    IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+    VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.wmv', '.webm')
     
     title = models.CharField(max_length=200, null=True, blank=True, default="Untitled Post")
     content = models.TextField()
     author = models.ForeignKey(User, related_name='posts', on_delete=models.CASCADE)
-    media = models.FileField(upload_to='post_media/', null=True, blank=True)
+    media = models.FileField(upload_to='post_media/', storage=get_media_storage, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     post_type = models.CharField(max_length=10, choices=POST_TYPES, default='text')
     metadata = models.JSONField(null=True, blank=True)
+    # Denormalized counters, kept in step with Like/Comment writes (see posts.counters)
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    # Precomputed "top" feed ranking, refreshed when the counters change (see posts.ranking)
+    score = models.FloatField(default=0)
+    score_dirty = models.BooleanField(default=True)
+    # Last like/comment activity, lets polling clients fetch only changed counters
+    activity_at = models.DateTimeField(default=timezone.now, db_index=True)
+    # Columns only posts.counters and posts.ranking write; updates of a loaded post skip them
+    DENORMALIZED_FIELDS = ('like_count', 'comment_count', 'score', 'score_dirty', 'activity_at')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score', '-id'], name='post_score_idx'),
+            models.Index(fields=['id'], condition=models.Q(score_dirty=True), name='post_score_dirty_idx'),
+            # Newest-first listings, one index per filter combination of PostListCreate
+            models.Index(fields=['-created_at', '-id'], name='post_recent_idx'),
+            models.Index(fields=['author', '-created_at', '-id'], name='post_author_recent_idx'),
+            models.Index(fields=['post_type', '-created_at', '-id'], name='post_type_recent_idx'),
+            models.Index(fields=['author', 'post_type', '-created_at', '-id'], name='post_author_type_recent_idx'),
+        ]
 
     def clean(self):
         config = ConfigManager()
@@ -104,12 +130,12 @@ class Post(models.Model):
                 self.metadata.update(file_info)
             
             if self.post_type == 'image':
-                allowed_extensions = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+                allowed_extensions = self.IMAGE_EXTENSIONS
                 if hasattr(self.media, 'name') and not str(self.media.name).lower().endswith(allowed_extensions):
                     raise ValidationError(f'Invalid image format. Please use: {", ".join(allowed_extensions)}')
                 
             elif self.post_type == 'video':
-                allowed_extensions = ('.mp4', '.mov', '.avi', '.wmv', '.webm')
+                allowed_extensions = self.VIDEO_EXTENSIONS
                 if hasattr(self.media, 'name') and not str(self.media.name).lower().endswith(allowed_extensions):
                     raise ValidationError(f'Invalid video format. Please use: {", ".join(allowed_extensions)}')
                     
@@ -120,9 +146,18 @@ class Post(models.Model):
                         'file_type': str(self.media.name).split('.')[-1].lower() if hasattr(self.media, 'name') else ''
                     })
 
-    def save(self, *args, **kwargs):
-        self.clean()
-        super().save(*args, **kwargs)
+    def save(self, *args, validate=True, **kwargs):
+        # Callers that already ran full_clean() pass validate=False
+        if validate:
+            self.clean()
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # The denormalized columns move by F() updates from concurrent writers;
+            # writing back this instance's copy of them would undo those
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in self.DENORMALIZED_FIELDS]
+        # Timeline fan-out and counter updates run from post_save, inside this transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.post_type} post by {self.author.username} at {self.created_at}"
@@ -135,6 +170,11 @@ class Like(models.Model):
     class Meta:
         unique_together = ('user', 'post')  # Prevent multiple likes from same user
 
+    def save(self, *args, **kwargs):
+        # Counter updates run from post_save, inside this transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Like by {self.user.username} on Post {self.post.id}"
 
@@ -146,6 +186,11 @@ class UserFollow(models.Model):
     class Meta:
         unique_together = ('follower', 'followed')
 
+    def save(self, *args, **kwargs):
+        # Profile counter updates run from post_save, inside this transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.follower.username} follows {self.followed.username}"
 
@@ -154,6 +199,79 @@ class Comment(models.Model):
     author = models.ForeignKey(User, related_name='comments', on_delete=models.CASCADE)
     post = models.ForeignKey(Post, related_name='comments', on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def save(self, *args, **kwargs):
+        # Counter updates run from post_save, inside this transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Comment by {self.author.username} on Post {self.post.id}"
+
+class TimelineEntry(models.Model):
+    """Materialized row of a user's followed feed, written when a followed author posts"""
+    user = models.ForeignKey(User, related_name='timeline_entries', on_delete=models.CASCADE)
+    post = models.ForeignKey(Post, related_name='timeline_entries', on_delete=models.CASCADE)
+    post_created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(fields=['user', '-post_created_at'], name='timeline_user_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"Post {self.post_id} in timeline of user {self.user_id}"
+
+
+class UploadSession(models.Model):
+    """A resumable upload of a large video; chunks live on disk until the post is finalized"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, related_name='upload_sessions', on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True)
+    total_size = models.PositiveBigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    @property
+    def chunk_count(self):
+        return -(-self.total_size // self.chunk_size)
+
+    def expected_chunk_size(self, index):
+        """Every chunk is chunk_size bytes except a shorter last one"""
+        return min(self.chunk_size, self.total_size - index * self.chunk_size)
+
+    def __str__(self):
+        return f"Upload {self.id} of {self.filename} by {self.user_id}"
+
+class UploadChunk(models.Model):
+    session = models.ForeignKey(UploadSession, related_name='chunks', on_delete=models.CASCADE)
+    index = models.PositiveIntegerField()
+    size = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ('session', 'index')
+
+    def __str__(self):
+        return f"Chunk {self.index} of upload {self.session_id}"
+
+class MediaBlob(models.Model):
+    """A content-addressed media file and how many posts/profiles reference it"""
+    name = models.CharField(max_length=255, primary_key=True)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    # Responsive versions of images; null while waiting for generate_derivatives
+    derivatives = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], condition=models.Q(derivatives__isnull=True),
+                         name='blob_derivatives_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} references)"
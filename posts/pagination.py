@@ -0,0 +1,199 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from . import ranking
+
+
+class FeedPagination(PageNumberPagination):
+    page_size = 5
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opaque cursor pagination keyed on the queryset's ordering columns.
+
+    Each page is a single range query on ``(created_at, id)`` (or whatever
+    unique ordering the queryset declares), so the cost does not depend on
+    how deep the client scrolls and the table is never counted. Clients that
+    really need page numbers can opt in with ``?page=``, which falls back to
+    ``offset_pagination_class``.
+    """
+    page_size = 5
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering = ('-created_at', '-id')
+    offset_pagination_class = FeedPagination
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.offset_paginator = None
+
+        if self.offset_pagination_class and 'page' in request.query_params:
+            self.offset_paginator = self.offset_pagination_class()
+            return self.offset_paginator.paginate_queryset(queryset, request, view)
+
+        self.page_size = self.get_page_size(request)
+        declared = tuple(queryset.query.order_by)
+        if declared and all(isinstance(field, str) for field in declared):
+            self.ordering = declared
+        self.base_url = remove_query_param(request.build_absolute_uri(), 'page')
+
+        cursor = self.decode_cursor(request, queryset)
+        reverse = False
+        if cursor is not None:
+            values, reverse = cursor
+            ordering = self._reversed(self.ordering) if reverse else self.ordering
+            queryset = queryset.order_by(*ordering).filter(self._after(ordering, values))
+        else:
+            values, ordering = None, self.ordering
+            queryset = queryset.order_by(*self.ordering)
+        queryset = self.window(queryset, ordering, values)
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next = bool(results)
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None and bool(results)
+
+        self.page = results
+        return results
+
+    def window(self, queryset, ordering, cursor_values):
+        """Hook to narrow the query for one page read in ``ordering``, after the cursor"""
+        return queryset
+
+    def get_paginated_response(self, data):
+        if self.offset_paginator is not None:
+            return self.offset_paginator.get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data
+        })
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self._link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self._link(self.page[0], reverse=True)
+
+    def decode_cursor(self, request, queryset):
+        """``(values, reverse)`` from the request's cursor, values converted to their ordering column's type"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+            values = payload['v']
+            reverse = bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            values = [self._load(queryset, field.lstrip('-'), value) for field, value in zip(self.ordering, values)]
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    def encode_cursor(self, values, reverse=False):
+        payload = json.dumps(
+            {'v': [self._dump(value) for value in values], 'r': int(reverse)},
+            separators=(',', ':')
+        )
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def _link(self, obj, reverse):
+        values = [self._value(obj, field.lstrip('-')) for field in self.ordering]
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(values, reverse))
+
+    @staticmethod
+    def _value(obj, name):
+        if isinstance(obj, dict):
+            return obj[name]
+        return getattr(obj, name)
+
+    @staticmethod
+    def _load(queryset, name, value):
+        """Convert a cursor value back with the model field or annotation it was read from"""
+        if value is None or isinstance(value, (list, dict)):
+            raise ValueError(name)
+        return queryset.query.chain().resolve_ref(name).output_field.to_python(value)
+
+    @staticmethod
+    def _dump(value):
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        return value
+
+    @staticmethod
+    def _reversed(ordering):
+        return tuple(field[1:] if field.startswith('-') else f'-{field}' for field in ordering)
+
+    @staticmethod
+    def _after(ordering, values):
+        """Build the row-value comparison ``(a, b, ...) > cursor`` as nested OR/AND clauses"""
+        condition = Q()
+        for index, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            clause = Q(**{f'{name}__{lookup}': values[index]})
+            for previous_field, previous_value in zip(ordering[:index], values[:index]):
+                clause &= Q(**{previous_field.lstrip('-'): previous_value})
+            condition |= clause
+        return condition
+
+
+class NewsFeedPagination(KeysetPagination):
+    """Keyset pages for the news feed; ``sort=top`` pages only sort a window of the score index"""
+
+    def window(self, queryset, ordering, cursor_values):
+        if ordering[0].lstrip('-') != 'rank':
+            return queryset
+        return ranking.candidate_window(
+            queryset, self.page_size + 1, descending=ordering[0].startswith('-'),
+            cursor_rank=cursor_values[0] if cursor_values else None
+        )
+
+
+class CommentPagination(KeysetPagination):
+    """Oldest-first cursor pages for a post's comment thread"""
+    page_size = 20
+    ordering = ('created_at', 'id')
+
+
+class LikePagination(KeysetPagination):
+    """Newest-first cursor pages for a post's likes"""
+    page_size = 20
@@ -0,0 +1,158 @@
+"""
+Publish/subscribe of live post, like and comment events.
+
+Saves publish small JSON-able events to named channels (``author:<id>`` for
+new posts, ``post:<id>`` for counter changes); the SSE endpoint subscribes
+to the channels a client cares about. The backend is chosen with the
+EVENT_BROKER setting: the in-memory broker only reaches subscribers in the
+same process, RedisBroker shares events between processes.
+"""
+import asyncio
+import json
+import threading
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+def author_channel(user_id):
+    return f'author:{user_id}'
+
+
+def post_channel(post_id):
+    return f'post:{post_id}'
+
+
+class BaseBroker:
+    def publish(self, channel, event):
+        """Deliver an event to every subscriber of the channel; callable from any thread"""
+        raise NotImplementedError
+
+    async def subscribe(self, channels):
+        """Return a Subscription yielding events published to any of the channels"""
+        raise NotImplementedError
+
+
+class Subscription:
+    """A subscriber's bounded queue of events, bound to the event loop it was created on"""
+
+    def __init__(self, on_close=None):
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.loop = asyncio.get_running_loop()
+        self._on_close = on_close
+
+    def deliver(self, event):
+        # Slow consumers lose events rather than growing memory without bound
+        if not self.queue.full():
+            self.queue.put_nowait(event)
+
+    async def get(self, timeout=None):
+        """Next event, or None if nothing arrived within timeout seconds"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self):
+        if self._on_close:
+            result = self._on_close(self)
+            if asyncio.iscoroutine(result):
+                await result
+            self._on_close = None
+
+
+class InMemoryBroker(BaseBroker):
+    """Fan-out within the current process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+
+    async def subscribe(self, channels):
+        channels = set(channels)
+        subscription = Subscription(on_close=lambda sub: self._unsubscribe(sub, channels))
+        with self._lock:
+            for channel in channels:
+                self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription, channels):
+        with self._lock:
+            for channel in channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[channel]
+
+
+class RedisBroker(BaseBroker):
+    """Fan-out across processes through Redis pub/sub (needs the redis package and REDIS_URL)"""
+
+    def __init__(self):
+        try:
+            import redis
+            import redis.asyncio
+        except ImportError:
+            raise ImproperlyConfigured('RedisBroker requires the "redis" package')
+        self.url = getattr(settings, 'REDIS_URL', None)
+        if not self.url:
+            raise ImproperlyConfigured('RedisBroker requires the REDIS_URL setting')
+        self._client = redis.Redis.from_url(self.url)
+        self._async_redis = redis.asyncio
+
+    def publish(self, channel, event):
+        self._client.publish(channel, json.dumps(event))
+
+    async def subscribe(self, channels):
+        client = self._async_redis.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(*channels)
+
+        async def close(subscription):
+            reader.cancel()
+            await pubsub.aclose()
+            await client.aclose()
+
+        subscription = Subscription(on_close=close)
+
+        async def read():
+            async for message in pubsub.listen():
+                if message.get('type') == 'message':
+                    subscription.deliver(json.loads(message['data']))
+
+        reader = asyncio.ensure_future(read())
+        return subscription
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """The process-wide broker configured by settings.EVENT_BROKER"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, 'EVENT_BROKER', 'posts.pubsub.InMemoryBroker')
+                _broker = import_string(path)()
+    return _broker
+
+
+def publish(channel, event):
+    get_broker().publish(channel, event)
+
+
+def publish_on_commit(channel, event):
+    """Publish once the surrounding transaction commits, so rolled back writes stay silent"""
+    transaction.on_commit(lambda: publish(channel, event))
@@ -0,0 +1,100 @@
+"""
+Engagement ranking for the "top" feed.
+
+The score is log10(likes + COMMENT_WEIGHT * comments) plus the post's age
+expressed in RANK_DECAY_SECONDS units since a fixed epoch. Newer posts get a
+larger time term, so older posts decay relative to them without anyone
+rewriting their scores. A stored score only goes stale when a post's
+counters change; those rows are flagged score_dirty and refreshed in
+batches by refresh_scores().
+
+The viewer's ``rank`` boosts followed authors, so it cannot be read from an
+index. Top feed pages are instead cut down to a score window read from
+post_score_idx (see candidate_window()) and only that window is sorted.
+"""
+import math
+from datetime import datetime, timezone
+from django.db import transaction
+from django.db.models import Case, F, FloatField, When
+from django.utils import timezone as django_timezone
+from .models import Post, UserFollow
+from singletons.config_manager import ConfigManager
+
+RANK_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+COMMENT_WEIGHT = 2
+# Slack for comparing stored scores with ranks computed in SQL
+SCORE_MARGIN = 1e-6
+
+
+def engagement_score(like_count, comment_count, created_at):
+    config = ConfigManager()
+    engagement = max(like_count + COMMENT_WEIGHT * comment_count, 1)
+    age_term = (created_at - RANK_EPOCH).total_seconds() / config.get_setting('RANK_DECAY_SECONDS')
+    return round(math.log10(engagement) + age_term, 7)
+
+
+def score_new_post(post):
+    """Give a post its initial score before it is first inserted"""
+    post.score = engagement_score(post.like_count, post.comment_count,
+                                  post.created_at or django_timezone.now())
+    post.score_dirty = False
+
+
+def refresh_scores(batch_size=500):
+    """Recompute scores for posts whose counters changed; returns how many were refreshed"""
+    refreshed = 0
+    while True:
+        rows = list(
+            Post.objects.filter(score_dirty=True)
+            .order_by('id')
+            .values_list('id', 'like_count', 'comment_count', 'created_at')[:batch_size]
+        )
+        if not rows:
+            return refreshed
+
+        with transaction.atomic():
+            for post_id, like_count, comment_count, created_at in rows:
+                # Only clear the flag if the counters did not move while we computed
+                refreshed += Post.objects.filter(
+                    pk=post_id, like_count=like_count, comment_count=comment_count
+                ).update(
+                    score=engagement_score(like_count, comment_count, created_at),
+                    score_dirty=False
+                )
+
+
+def rank_for_viewer(queryset, user):
+    """Annotate ``rank``: the stored score, boosted for authors the viewer follows"""
+    boost = ConfigManager().get_setting('RANK_FOLLOWED_BOOST')
+    followed = UserFollow.objects.filter(follower=user).values('followed_id')
+    return queryset.annotate(rank=Case(
+        When(author_id__in=followed, then=F('score') + boost),
+        default=F('score'),
+        output_field=FloatField()
+    ))
+
+
+def candidate_window(queryset, size, descending=True, cursor_rank=None):
+    """
+    Restrict a rank_for_viewer queryset about to be read in rank order to the
+    scores that can reach its first ``size`` rows.
+
+    A rank is the score, or the score plus RANK_FOLLOWED_BOOST, so after the
+    first ``size`` rows in score order (an index range scan) nothing scored
+    more than the boost beyond the last of them can rank among the first
+    ``size``. A cursor at ``cursor_rank`` bounds the other end of the range.
+    """
+    boost = ConfigManager().get_setting('RANK_FOLLOWED_BOOST') + SCORE_MARGIN
+    if descending:
+        if cursor_rank is not None:
+            queryset = queryset.filter(score__lte=cursor_rank + SCORE_MARGIN)
+        scores = list(queryset.order_by('-score', '-id').values_list('score', flat=True)[:size])
+        if len(scores) == size:
+            queryset = queryset.filter(score__gte=scores[-1] - boost)
+    else:
+        if cursor_rank is not None:
+            queryset = queryset.filter(score__gte=cursor_rank - boost)
+        scores = list(queryset.order_by('score', 'id').values_list('score', flat=True)[:size])
+        if len(scores) == size:
+            queryset = queryset.filter(score__lte=scores[-1] + boost)
+    return queryset
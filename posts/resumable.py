@@ -0,0 +1,138 @@
+"""
+Resumable chunked uploads for large video posts.
+
+A client opens an UploadSession, PUTs fixed-size numbered chunks in any
+order (or in parallel), asks which chunks arrived, and finalizes once all
+are present. Chunks are written to UPLOAD_SESSION_ROOT/<session id>/ and
+each one only becomes visible after it is fully on disk. Finalizing streams
+the chunks in order into a single temporary file, hashing it on the way,
+which the storage backend then moves into place. Abandoned sessions are
+removed by the cleanup_upload_sessions command.
+"""
+import hashlib
+import os
+import shutil
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.db import transaction
+from django.utils import timezone
+from .models import Post, UploadChunk, UploadSession
+from singletons.config_manager import ConfigManager
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def session_dir(session):
+    return os.path.join(settings.UPLOAD_SESSION_ROOT, str(session.pk))
+
+
+def chunk_path(session, index):
+    return os.path.join(session_dir(session), f'{index}.part')
+
+
+def open_session(user, filename, total_size, content_type=''):
+    config = ConfigManager()
+    max_size = config.get_setting('MAX_FILE_SIZE')
+    if total_size <= 0:
+        raise ValidationError('Upload size must be positive')
+    if total_size > max_size:
+        raise ValidationError(f'File size exceeds maximum limit of {max_size/1024/1024:.1f}MB')
+    # Checked up front so clients do not upload gigabytes that finalizing would reject
+    if not filename.lower().endswith(Post.VIDEO_EXTENSIONS):
+        raise ValidationError(f'Invalid video format. Please use: {", ".join(Post.VIDEO_EXTENSIONS)}')
+
+    session = UploadSession.objects.create(
+        user=user,
+        filename=os.path.basename(filename)[:255],
+        content_type=content_type or '',
+        total_size=total_size,
+        chunk_size=config.get_setting('UPLOAD_CHUNK_SIZE')
+    )
+    os.makedirs(session_dir(session), exist_ok=True)
+    return session
+
+
+def write_chunk(session, index, stream):
+    """Copy one chunk from a file-like request stream to disk; returns the bytes written"""
+    if index >= session.chunk_count:
+        raise ValidationError(f'Chunk index must be below {session.chunk_count}')
+    expected = session.expected_chunk_size(index)
+
+    os.makedirs(session_dir(session), exist_ok=True)
+    final_path = chunk_path(session, index)
+    # A unique partial name lets retries of the same chunk run in parallel safely
+    partial_path = f'{final_path}.{uuid.uuid4().hex}'
+    written = 0
+    try:
+        with open(partial_path, 'wb') as partial:
+            while True:
+                data = stream.read(min(COPY_BUFFER_SIZE, expected - written + 1))
+                if not data:
+                    break
+                written += len(data)
+                if written > expected:
+                    raise ValidationError(f'Chunk {index} must be {expected} bytes')
+                partial.write(data)
+        if written != expected:
+            raise ValidationError(f'Chunk {index} must be {expected} bytes, got {written}')
+        os.replace(partial_path, final_path)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+    UploadChunk.objects.update_or_create(session=session, index=index, defaults={'size': written})
+    # Keep the session alive for the cleanup job
+    UploadSession.objects.filter(pk=session.pk).update(updated_at=timezone.now())
+    return written
+
+
+def received_chunks(session):
+    return list(session.chunks.order_by('index').values_list('index', flat=True))
+
+
+def assemble(session):
+    """
+    Concatenate the chunks, in order and a buffer at a time, into a temporary
+    upload file carrying ``size`` and ``sha256`` like a streamed upload.
+    """
+    received = received_chunks(session)
+    missing = sorted(set(range(session.chunk_count)) - set(received))
+    if missing:
+        raise ValidationError(f'Missing chunks: {", ".join(map(str, missing[:20]))}')
+
+    assembled = TemporaryUploadedFile(session.filename, session.content_type, session.total_size, None)
+    digest = hashlib.sha256()
+    for index in range(session.chunk_count):
+        with open(chunk_path(session, index), 'rb') as chunk:
+            while True:
+                data = chunk.read(COPY_BUFFER_SIZE)
+                if not data:
+                    break
+                digest.update(data)
+                assembled.write(data)
+    assembled.flush()
+    assembled.seek(0)
+    assembled.sha256 = digest.hexdigest()
+    return assembled
+
+
+def discard(session):
+    """Delete a session; its chunk files go once the deletion commits"""
+    directory = session_dir(session)
+    session.delete()
+    transaction.on_commit(lambda: shutil.rmtree(directory, ignore_errors=True))
+
+
+def discard_abandoned(max_age=None):
+    """Remove sessions untouched for longer than max_age (default UPLOAD_SESSION_TTL); returns how many"""
+    if max_age is None:
+        max_age = timedelta(seconds=ConfigManager().get_setting('UPLOAD_SESSION_TTL'))
+    stale = UploadSession.objects.filter(updated_at__lt=timezone.now() - max_age)
+    removed = 0
+    for session in stale.iterator():
+        discard(session)
+        removed += 1
+    return removed
@@ -1,36 +1,121 @@
 import json
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Post, Comment, Like, UserProfile
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from .models import Post, Comment, Like, UserFollow, UserProfile
+from . import derivatives, like_buffer
+from singletons.config_manager import ConfigManager
 
-class UserProfileSerializer(serializers.ModelSerializer):
+
+def viewer_is_admin(request):
+    """Whether the requesting user is in the Admin group, checked once per request"""
+    if not request or not request.user.is_authenticated:
+        return False
+    if not hasattr(request, '_viewer_is_admin'):
+        request._viewer_is_admin = request.user.groups.filter(name='Admin').exists()
+    return request._viewer_is_admin
+
+
+def _listed_param(request, name):
+    params = getattr(request, 'query_params', None)
+    if params is None or name not in params:
+        return None
+    return {item.strip() for item in params[name].split(',') if item.strip()}
+
+
+def selected_fields(request, available):
+    """
+    Names among ``available`` that a read request keeps with ``?fields=a,b``
+    and/or ``?omit=c``; everything for writes and when neither is given.
+    Unknown names are ignored.
+    """
+    selected = set(available)
+    if request is None or request.method not in ('GET', 'HEAD'):
+        return selected
+    fields = _listed_param(request, 'fields')
+    if fields is not None:
+        selected &= fields
+    return selected - (_listed_param(request, 'omit') or set())
+
+
+class SparseFieldsMixin:
+    """
+    Drops the fields a read request did not select before serialization, so
+    their SerializerMethodFields never run. Only the top-level serializer (or
+    the items of a top-level list) is trimmed; nested serializers are whole.
+    ``related_fields`` maps field names to the select_related paths they need.
+    """
+    related_fields = {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        parent = self.parent
+        if parent is not None and not (isinstance(parent, serializers.ListSerializer) and parent.parent is None):
+            return fields
+        selected = selected_fields(self.context.get('request'), fields)
+        return {name: field for name, field in fields.items() if name in selected}
+
+    @classmethod
+    def selected_fields(cls, request):
+        return selected_fields(request, cls.Meta.fields)
+
+    @classmethod
+    def select_related(cls, queryset, request, prefix=''):
+        """Join only the relations the selected fields read"""
+        selected = cls.selected_fields(request)
+        related = [prefix + path for name, path in cls.related_fields.items() if name in selected]
+        return queryset.select_related(*related) if related else queryset
+
+
+class ViewerState:
+    """Viewer-specific facts for a page of posts, resolved in a fixed number of queries"""
+
+    def __init__(self, followed_author_ids=(), liked_post_ids=()):
+        self.followed_author_ids = set(followed_author_ids)
+        self.liked_post_ids = set(liked_post_ids)
+
+    @classmethod
+    def for_posts(cls, request, posts, following=True, liked=True):
+        """Pass following/liked=False to skip lookups nothing will read"""
+        return cls.for_ids(request, [post.pk for post in posts], {post.author_id for post in posts},
+                           following=following, liked=liked)
+
+    @classmethod
+    def for_ids(cls, request, post_ids, author_ids, following=True, liked=True):
+        """Same as for_posts, from the posts' ids and their authors' ids"""
+        if not post_ids:
+            return cls()
+        if not request or not request.user.is_authenticated:
+            return cls()
+
+        user = request.user
+        author_ids = set(author_ids) - {user.id}
+        followed = UserFollow.objects.filter(follower=user, followed_id__in=author_ids)\
+            .values_list('followed_id', flat=True) if following and author_ids else ()
+        liked_ids = Like.objects.filter(user=user, post_id__in=post_ids)\
+            .values_list('post_id', flat=True) if liked else ()
+        return cls(followed, liked_ids)
+
+class UserProfileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
     full_name = serializers.SerializerMethodField()
-    posts_count = serializers.SerializerMethodField()
-    followers_count = serializers.SerializerMethodField()
-    following_count = serializers.SerializerMethodField()
     is_following = serializers.SerializerMethodField()
     avatar_url = serializers.SerializerMethodField()
+    avatar_srcset = serializers.SerializerMethodField()
     cover_url = serializers.SerializerMethodField()
+    cover_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = UserProfile
         fields = ['username', 'full_name', 'bio', 'location', 'website', 
-                 'avatar_url', 'cover_url', 'posts_count', 'followers_count', 
-                 'following_count', 'is_following']
+                 'avatar_url', 'avatar_srcset', 'cover_url', 'cover_srcset', 'posts_count',
+                 'followers_count', 'following_count', 'is_following']
+        read_only_fields = ['posts_count', 'followers_count', 'following_count']
 
     def get_full_name(self, obj):
         return obj.user.get_full_name() or obj.user.username
 
-    def get_posts_count(self, obj):
-        return obj.user.posts.count()
-
-    def get_followers_count(self, obj):
-        return obj.user.followers.count()
-
-    def get_following_count(self, obj):
-        return obj.user.following.count()
-
     def get_is_following(self, obj):
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
@@ -49,6 +134,24 @@ class UserProfileSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(obj.cover_photo.url)
         return None
 
+    def _derivatives(self, obj):
+        # Both images of a profile are looked up together
+        if not hasattr(self, '_derivative_records'):
+            self._derivative_records = derivatives.records_for([obj.avatar.name, obj.cover_photo.name])
+        return self._derivative_records
+
+    def get_avatar_srcset(self, obj):
+        request = self.context.get('request')
+        if not obj.avatar or not request:
+            return None
+        return derivatives.srcset(request, obj.avatar, self._derivatives(obj).get(obj.avatar.name))
+
+    def get_cover_srcset(self, obj):
+        request = self.context.get('request')
+        if not obj.cover_photo or not request:
+            return None
+        return derivatives.srcset(request, obj.cover_photo, self._derivatives(obj).get(obj.cover_photo.name))
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -69,48 +172,161 @@ class LikeSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("User has already liked this post.")
         return data
 
-class PostSerializer(serializers.ModelSerializer):
-    comments = serializers.StringRelatedField(many=True, read_only=True)
-    author_username = serializers.CharField(source='author.username', read_only=True)
+def new_post_context(request, post):
+    """Serializer context for echoing a post just created: it has no likes or comments yet"""
+    return {'request': request, 'viewer': ViewerState(), 'comment_previews': {post.pk: []},
+            'media_derivatives': {}}
+
+def latest_comments(post_ids):
+    """Latest COMMENT_PREVIEW_COUNT comments per post, fetched with one windowed query"""
+    limit = ConfigManager().get_setting('COMMENT_PREVIEW_COUNT')
+    previews = {post_id: [] for post_id in post_ids}
+    if not post_ids or not limit:
+        return previews
+
+    rows = Comment.objects.filter(post_id__in=post_ids)\
+        .annotate(position=Window(
+            expression=RowNumber(),
+            partition_by=[F('post_id')],
+            order_by=[F('created_at').desc(), F('id').desc()]
+        ))\
+        .filter(position__lte=limit)\
+        .order_by('post_id', 'created_at', 'id')\
+        .values('id', 'post_id', 'text', 'created_at', author_username=F('author__username'))
+
+    for row in rows:
+        previews[row['post_id']].append(row)
+    return previews
+
+
+class CommentPreviewSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    author_username = serializers.CharField()
+    text = serializers.CharField()
+    created_at = serializers.DateTimeField()
+
+
+class PostListSerializer(serializers.ListSerializer):
+    """
+    Serializes a page of posts, resolving viewer-specific fields for the whole
+    page at once; lookups for fields left out by ?fields=/?omit= are skipped
+    """
+    def to_representation(self, data):
+        posts = list(data.all() if hasattr(data, 'all') else data)
+        fields = self.child.fields
+        if 'is_following' in fields or 'liked_by_me' in fields:
+            self.context['viewer'] = ViewerState.for_posts(
+                self.context.get('request'), posts,
+                following='is_following' in fields, liked='liked_by_me' in fields
+            )
+        if 'comment_previews' in fields:
+            self.context['comment_previews'] = latest_comments([post.pk for post in posts])
+        if 'media_srcset' in fields:
+            self.context['media_derivatives'] = derivatives.records_for([post.media.name for post in posts])
+        return super().to_representation(posts)
+
+
+class PostGridListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        posts = list(data.all() if hasattr(data, 'all') else data)
+        self.context['media_derivatives'] = derivatives.records_for([post.media.name for post in posts])
+        return super().to_representation(posts)
+
+
+class PostGridSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """Compact tile for profile media grids: no author, comments or viewer state"""
+    thumbnail_url = serializers.SerializerMethodField()
     like_count = serializers.SerializerMethodField()
-    comment_count = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Post
+        list_serializer_class = PostGridListSerializer
+        fields = ['id', 'post_type', 'thumbnail_url', 'like_count', 'comment_count']
+        read_only_fields = fields
+
+    def get_thumbnail_url(self, obj):
+        if not obj.media:
+            return None
+        records = self.context.get('media_derivatives')
+        if records is None:
+            records = derivatives.records_for([obj.media.name])
+        return derivatives.thumbnail(self.context['request'], obj.media, records.get(obj.media.name))
+
+    def get_like_count(self, obj):
+        return max(obj.like_count + like_buffer.pending(obj.pk), 0)
+
+
+class PostSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    comment_previews = serializers.SerializerMethodField()
+    author_username = serializers.CharField(source='author.username', read_only=True)
     media_url = serializers.SerializerMethodField()
+    media_srcset = serializers.SerializerMethodField()
     can_edit = serializers.SerializerMethodField()
     is_following = serializers.SerializerMethodField()
+    liked_by_me = serializers.SerializerMethodField()
+    like_count = serializers.SerializerMethodField()
+    related_fields = {'author_username': 'author'}
+
+    def get_like_count(self, obj):
+        # Includes likes this worker has buffered but not written yet
+        return max(obj.like_count + like_buffer.pending(obj.pk), 0)
 
     def get_is_following(self, obj):
         request = self.context.get('request')
-        if not request or not request.user.is_authenticated or obj.author == request.user:
+        if not request or not request.user.is_authenticated or obj.author_id == request.user.id:
             return False
-        return obj.author.followers.filter(follower=request.user).exists()
+        viewer = self.context.get('viewer')
+        if viewer is not None:
+            return obj.author_id in viewer.followed_author_ids
+        return UserFollow.objects.filter(follower=request.user, followed_id=obj.author_id).exists()
 
     def get_can_edit(self, obj):
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
             return False
         # User can edit if they're the author or an admin
-        return (obj.author == request.user or 
-                request.user.groups.filter(name='Admin').exists())
+        return obj.author_id == request.user.id or viewer_is_admin(request)
+
+    def get_comment_previews(self, obj):
+        previews = self.context.get('comment_previews')
+        if previews is None or obj.pk not in previews:
+            previews = latest_comments([obj.pk])
+        return CommentPreviewSerializer(previews[obj.pk], many=True).data
+
+    def get_liked_by_me(self, obj):
+        request = self.context.get('request')
+        if not request or not request.user.is_authenticated:
+            return False
+        viewer = self.context.get('viewer')
+        if viewer is not None:
+            return obj.pk in viewer.liked_post_ids
+        return Like.objects.filter(user=request.user, post_id=obj.pk).exists()
 
     class Meta:
         model = Post
-        fields = ['id', 'title', 'content', 'author', 'author_username', 'created_at', 'comments', 
+        list_serializer_class = PostListSerializer
+        fields = ['id', 'title', 'content', 'author', 'author_username', 'created_at', 'comment_previews',
                  'like_count', 'comment_count', 'post_type', 'metadata', 'media', 'media_url',
-                 'can_edit', 'is_following']
-        read_only_fields = ['created_at', 'media_url']
+                 'media_srcset', 'can_edit', 'is_following', 'liked_by_me']
+        # The author is always the requesting user, passed to save() by the view
+        read_only_fields = ['author', 'created_at', 'media_url', 'media_srcset', 'like_count', 'comment_count']
         
     def get_media_url(self, obj):
         if obj.media:
             return self.context['request'].build_absolute_uri(obj.media.url)
         return None
 
+    def get_media_srcset(self, obj):
+        if not obj.media:
+            return None
+        records = self.context.get('media_derivatives')
+        if records is None:
+            records = derivatives.records_for([obj.media.name])
+        return derivatives.srcset(self.context['request'], obj.media, records.get(obj.media.name))
+
     def validate(self, data):
         post_type = data.get('post_type', 'text')
         
-        # Skip author validation since it's added in the view
-        if 'author' in data and not User.objects.filter(id=data['author'].id).exists():
-            raise serializers.ValidationError({"author": "Author not found."})
-
         # Handle metadata validation
         metadata = data.get('metadata')
         if metadata is not None:
@@ -132,17 +348,12 @@ class PostSerializer(serializers.ModelSerializer):
         return data
 
     def create(self, validated_data):
-        # Create post instance (media is handled in the view)
+        # Media is part of validated_data, so the post is cleaned and inserted once
         return Post.objects.create(**validated_data)
-        
-    def get_like_count(self, obj):
-        return obj.likes.count()
-        
-    def get_comment_count(self, obj):
-        return obj.comments.count()
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author_username = serializers.CharField(source='author.username', read_only=True)
+    related_fields = {'author_username': 'author'}
     text = serializers.CharField(required=True, allow_blank=False, error_messages={
         'required': 'Comment text is required.',
         'blank': 'Comment cannot be empty.'
@@ -0,0 +1,159 @@
+import threading
+from collections import Counter
+from django.db import transaction
+from django.db.models.signals import post_init, pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import Post, Like, Comment, UserFollow, UserProfile
+from . import counters, feed_cache, follow_graph, like_buffer, media_blobs, pubsub, ranking, timeline
+
+# Posts the current thread's delete() is removing, tagged with that delete's origin
+_deleting = threading.local()
+
+
+@receiver(pre_save, sender=Post)
+def score_new_post(sender, instance, **kwargs):
+    """Insert new posts with their initial ranking score already computed"""
+    if instance._state.adding:
+        ranking.score_new_post(instance)
+
+
+def announce_new_posts(posts):
+    """
+    Fan new posts out to timelines, count them on the authors' profiles,
+    invalidate cached pages and publish live events. bulk_create skips
+    post_save, so batch inserts call this once.
+    """
+    followers = timeline.fan_out_posts(posts)
+    for author_id, created in Counter(post.author_id for post in posts).items():
+        counters.adjust_profile_counters(author_id, posts_count=created)
+    feed_cache.invalidate_all_posts()
+    feed_cache.invalidate_users(followers)
+    for post in posts:
+        pubsub.publish_on_commit(pubsub.author_channel(post.author_id), {
+            'type': 'post', 'id': post.pk, 'author': post.author_id
+        })
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    """Materialize a new post into the followers' home timelines"""
+    if created:
+        announce_new_posts([instance])
+    else:
+        feed_cache.invalidate_post(instance.pk)
+
+
+@receiver(pre_delete, sender=Post)
+def mark_deleted_post(sender, instance, origin=None, **kwargs):
+    """
+    Remember the posts a delete() removes, so the likes and comments it
+    cascades to skip the counter updates on their own, doomed, post
+    """
+    posts = getattr(_deleting, 'posts', None)
+    if posts is None or posts[0] is not origin:
+        _deleting.posts = posts = (origin, set())
+    posts[1].add(instance.pk)
+
+
+def _cascaded_from_post(instance, origin):
+    posts = getattr(_deleting, 'posts', None)
+    return posts is not None and posts[0] is origin and instance.post_id in posts[1]
+
+
+@receiver(post_delete, sender=Post)
+def forget_deleted_post(sender, instance, **kwargs):
+    feed_cache.invalidate_all_posts()
+    feed_cache.invalidate_post(instance.pk)
+    counters.adjust_profile_counters(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=UserFollow)
+def backfill_followed_posts(sender, instance, created, **kwargs):
+    """Backfill the follower's timeline with the followed user's recent posts"""
+    if created:
+        timeline.backfill_follow(instance.follower_id, instance.followed_id)
+        counters.adjust_profile_counters(instance.follower_id, following_count=1)
+        counters.adjust_profile_counters(instance.followed_id, followers_count=1)
+        feed_cache.invalidate_users([instance.follower_id])
+        transaction.on_commit(lambda: follow_graph.follow_added(instance.follower_id, instance.followed_id))
+
+
+@receiver(post_delete, sender=UserFollow)
+def prune_unfollowed_posts(sender, instance, **kwargs):
+    """Remove the unfollowed user's posts from the follower's timeline"""
+    timeline.prune_follow(instance.follower_id, instance.followed_id)
+    counters.adjust_profile_counters(instance.follower_id, following_count=-1)
+    counters.adjust_profile_counters(instance.followed_id, followers_count=-1)
+    feed_cache.invalidate_users([instance.follower_id])
+    transaction.on_commit(lambda: follow_graph.follow_removed(instance.follower_id, instance.followed_id))
+
+
+def _publish_count_change(post_id, kind, delta):
+    pubsub.publish_on_commit(pubsub.post_channel(post_id), {
+        'type': kind, 'post': post_id, 'delta': delta
+    })
+
+
+def like_added(post_id, user_id):
+    """Count a new like; also called by posts.likes, whose raw insert skips post_save"""
+    like_buffer.adjust_like_count(post_id, 1)
+    feed_cache.invalidate_post(post_id, [user_id])
+    _publish_count_change(post_id, 'like', 1)
+
+
+def like_removed(post_id, user_id):
+    like_buffer.adjust_like_count(post_id, -1)
+    feed_cache.invalidate_post(post_id, [user_id])
+    _publish_count_change(post_id, 'like', -1)
+
+
+@receiver(post_save, sender=Like)
+def count_new_like(sender, instance, created, **kwargs):
+    if created:
+        like_added(instance.post_id, instance.user_id)
+
+
+@receiver(post_delete, sender=Like)
+def count_removed_like(sender, instance, origin=None, **kwargs):
+    if not _cascaded_from_post(instance, origin):
+        like_removed(instance.post_id, instance.user_id)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.adjust_post_counters(instance.post_id, comment_count=1)
+        _publish_count_change(instance.post_id, 'comment', 1)
+    else:
+        # Edits change previews and threads without moving the counters
+        Post.objects.filter(pk=instance.post_id).update(activity_at=timezone.now())
+    feed_cache.invalidate_post(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def count_removed_comment(sender, instance, origin=None, **kwargs):
+    if _cascaded_from_post(instance, origin):
+        return
+    counters.adjust_post_counters(instance.post_id, comment_count=-1)
+    feed_cache.invalidate_post(instance.post_id)
+    _publish_count_change(instance.post_id, 'comment', -1)
+
+
+@receiver(post_init, sender=Post)
+@receiver(post_init, sender=UserProfile)
+def remember_media_blobs(sender, instance, **kwargs):
+    media_blobs.remember_names(instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=UserProfile)
+def count_media_references(sender, instance, **kwargs):
+    """Reference new blobs and release replaced ones"""
+    media_blobs.track_save(instance)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=UserProfile)
+def release_media_blobs(sender, instance, **kwargs):
+    media_blobs.track_delete(instance)
@@ -1,10 +1,15 @@
 // Global variables with proper initialization
 const state = {
     currentPage: 1,
+    nextUrl: null,
+    previousUrl: null,
+    since: null, // Delta token from the first feed page
     currentFilter: 'all',
     currentPostType: '',
     csrfToken: null,
     isLoading: false,
+    events: null, // Live event stream for the posts on screen
+    pollTimer: null, // Delta polling, used when live events are unavailable
     debounceTimers: {} // For debouncing actions
 };
 
@@ -28,6 +33,9 @@ document.addEventListener('DOMContentLoaded', () => {
             loadPosts();
             setupFilterListeners();
             setupMediaListeners();
+            if (!window.EventSource) {
+                startPolling();
+            }
         }
     } catch (error) {
         console.error('Error initializing app:', error);
@@ -35,6 +43,8 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 });
 
+const FEED_REFRESH_INTERVAL = 30000;
+
 // Debounce helper function
 function debounce(fn, delay, id) {
     return (...args) => {
@@ -459,17 +469,19 @@ function setupFilterListeners() {
 
     if (prevPage) {
         prevPage.addEventListener('click', () => {
-            if (state.currentPage > 1) {
+            if (state.previousUrl) {
                 state.currentPage--;
-                loadPosts();
+                loadPosts(state.previousUrl);
             }
         });
     }
 
     if (nextPage) {
         nextPage.addEventListener('click', () => {
-            state.currentPage++;
-            loadPosts();
+            if (state.nextUrl) {
+                state.currentPage++;
+                loadPosts(state.nextUrl);
+            }
         });
     }
 }
@@ -499,7 +511,7 @@ function createPostElement(post) {
         <div class="post-content">
             ${post.content ? post.content.replace(/</g, '&lt;').replace(/>/g, '&gt;').replace(/"/g, '&quot;').replace(/'/g, '&#39;') : ''}
             ${post.post_type === 'image' ? 
-                `<img src="${post.media_url}" alt="Post image" style="max-width: 100%; margin-top: 10px;">` : 
+                renderPostImage(post) : 
                 post.post_type === 'video' ? 
                 `<video src="${post.media_url}" controls style="max-width: 100%; margin-top: 10px;"></video>` : 
                 ''}
@@ -513,7 +525,7 @@ function createPostElement(post) {
             </div>
         </div>
         <div class="post-actions">
-            <button class="action-button${post.has_liked ? ' liked' : ''}" onclick="toggleLike(${post.id}, event)">
+            <button class="action-button${post.liked_by_me ? ' liked' : ''}" onclick="toggleLike(${post.id}, event)">
                 Like
             </button>
             <button class="action-button" onclick="toggleComments(${post.id})">
@@ -550,7 +562,8 @@ function createPostElement(post) {
         }
     })
     .then(handleAPIResponse)
-    .then(likes => {
+    .then(data => {
+        const likes = data.results || [];
         const likesList = document.getElementById(`likes-list-${post.id}`);
         if (likesList) {
             likesList.innerHTML = '';
@@ -582,7 +595,23 @@ function createPostElement(post) {
     return postItem;
 }
 
-function loadPosts() {
+function buildFeedUrl() {
+    let url = `api/feed/?_=${Date.now()}`;
+    
+    if (state.currentFilter === 'following') {
+        url += '&followed=true';
+    } else if (state.currentFilter === 'liked') {
+        url += '&liked=true';
+    }
+    
+    if (state.currentPostType) {
+        url += `&post_type=${state.currentPostType}`;
+    }
+    return url;
+}
+
+// Load a feed page; cursor links from the previous response are followed as-is
+function loadPosts(pageUrl) {
     if (state.isLoading) return;
     state.isLoading = true;
 
@@ -595,17 +624,7 @@ function loadPosts() {
     
     container.innerHTML = '<li class="loading">Loading posts...</li>';
 
-    let url = `api/feed/?page=${state.currentPage}&_=${Date.now()}`;
-    
-    if (state.currentFilter === 'following') {
-        url += '&followed=true';
-    } else if (state.currentFilter === 'liked') {
-        url += '&liked=true';
-    }
-    
-    if (state.currentPostType) {
-        url += `&post_type=${state.currentPostType}`;
-    }
+    const url = pageUrl || buildFeedUrl();
 
     fetch(url, {
         credentials: 'same-origin',
@@ -631,6 +650,10 @@ function loadPosts() {
             const prevPage = document.getElementById('prev-page');
             const nextPage = document.getElementById('next-page');
             
+            state.nextUrl = data.next;
+            state.previousUrl = data.previous;
+            state.since = data.since || null;
+            connectEvents();
             if (prevPage) prevPage.disabled = !data.previous;
             if (nextPage) nextPage.disabled = !data.next;
         } else {
@@ -650,6 +673,81 @@ function loadPosts() {
     });
 }
 
+// Pull only new posts and changed counters for the first page instead of reloading it
+function refreshFeed() {
+    const container = document.getElementById('posts-container');
+    if (!container || !state.since || state.previousUrl || state.isLoading || document.hidden) return;
+
+    const heldIds = Array.from(container.querySelectorAll('[data-post-id]'))
+        .map(item => item.getAttribute('data-post-id'));
+    const url = `${buildFeedUrl()}&since=${encodeURIComponent(state.since)}&ids=${heldIds.join(',')}`;
+
+    fetch(url, {
+        credentials: 'same-origin',
+        headers: {
+            'Accept': 'application/json',
+            'X-CSRFToken': state.csrfToken
+        }
+    })
+    .then(handleAPIResponse)
+    .then(data => {
+        state.since = data.since;
+        if (data.posts.length && container.querySelector('[data-post-id]') === null) {
+            container.innerHTML = '';
+        }
+        // Posts near the token's time can be sent again; keep the copy already shown
+        data.posts.slice().reverse().forEach(post => {
+            if (container.querySelector(`[data-post-id="${post.id}"]`)) return;
+            container.insertBefore(createPostElement(post), container.firstChild);
+        });
+        if (data.posts.length) connectEvents();
+        data.updates.forEach(update => {
+            const likeCount = document.getElementById(`like-count-${update.id}`);
+            const commentCount = document.getElementById(`comment-count-${update.id}`);
+            if (likeCount) likeCount.textContent = update.like_count;
+            if (commentCount) commentCount.textContent = update.comment_count;
+        });
+    })
+    .catch(error => {
+        console.error('Error refreshing feed:', error);
+    });
+}
+
+// Poll for deltas instead of streaming (no EventSource, or the server cannot stream)
+function startPolling() {
+    if (!state.pollTimer) {
+        state.pollTimer = setInterval(refreshFeed, FEED_REFRESH_INTERVAL);
+    }
+}
+
+// Subscribe to live events for the posts on screen; each event triggers a delta refresh
+function connectEvents() {
+    if (!window.EventSource || state.pollTimer) return;
+    if (state.events) state.events.close();
+
+    const heldIds = Array.from(document.querySelectorAll('#posts-container [data-post-id]'))
+        .map(item => item.getAttribute('data-post-id'));
+    const events = new EventSource(`api/events/?posts=${heldIds.join(',')}`);
+    state.events = events;
+
+    const refresh = debounce(refreshFeed, 500, 'events');
+    ['post', 'like', 'comment'].forEach(type => events.addEventListener(type, refresh));
+    events.addEventListener('error', () => {
+        // EventSource retries dropped connections itself; it gives up on error responses (e.g. 501)
+        if (events.readyState === EventSource.CLOSED && state.events === events) {
+            state.events = null;
+            startPolling();
+        }
+    });
+}
+
+// Responsive image: WebP derivatives where supported, the original until derivatives exist
+function renderPostImage(post) {
+    const srcset = post.media_srcset || {};
+    const webp = srcset['image/webp'] ? `<source type="image/webp" srcset="${srcset['image/webp']}" sizes="(max-width: 700px) 100vw, 640px">` : '';
+    return `<picture>${webp}<img src="${post.media_url}" srcset="${srcset.default || post.media_url}" sizes="(max-width: 700px) 100vw, 640px" alt="Post image" loading="lazy" style="max-width: 100%; margin-top: 10px;"></picture>`;
+}
+
 // Make functions available globally for profile.js
 window.createPostElement = createPostElement;
 
@@ -717,11 +815,9 @@ function loadComments(postId) {
         }
         return response.json();
     })
-    .then(comments => {
+    .then(data => {
         commentsList.innerHTML = '';
-        comments.forEach(comment => {
-            commentsList.appendChild(createCommentElement(comment));
-        });
+        appendComments(postId, data);
     })
     .catch(error => {
         console.error('Error loading comments:', error);
@@ -729,6 +825,39 @@ function loadComments(postId) {
     });
 }
 
+function appendComments(postId, data) {
+    const commentsList = document.getElementById(`comments-list-${postId}`);
+    (data.results || []).forEach(comment => {
+        commentsList.appendChild(createCommentElement(comment));
+    });
+
+    if (data.next) {
+        const more = document.createElement('button');
+        more.className = 'action-button load-more-comments';
+        more.textContent = 'Load more comments';
+        more.onclick = () => {
+            more.disabled = true;
+            fetch(data.next, {
+                credentials: 'include',
+                headers: {
+                    'Accept': 'application/json',
+                    'X-CSRFToken': state.csrfToken
+                }
+            })
+            .then(handleAPIResponse)
+            .then(nextData => {
+                more.remove();
+                appendComments(postId, nextData);
+            })
+            .catch(error => {
+                console.error('Error loading comments:', error);
+                more.disabled = false;
+            });
+        };
+        commentsList.appendChild(more);
+    }
+}
+
 function createCommentElement(comment) {
     const div = document.createElement('div');
     div.className = 'comment';
@@ -791,7 +920,8 @@ function fetchLikes(postId) {
         }
     })
     .then(handleAPIResponse)
-    .then(likes => {
+    .then(data => {
+        const likes = data.results || [];
         const likesList = document.getElementById(`likes-list-${postId}`);
         if (likesList) {
             likesList.innerHTML = '';
@@ -847,47 +977,25 @@ async function toggleLike(postId, event) {
     const likeCount = document.getElementById(`like-count-${postId}`);
 
     try {
-        // First try to create a like
-        const createResponse = await fetch(`/api/posts/${postId}/like/`, {
-            method: 'POST',
+        // The feed tells us whether we already like the post, so pick the request up front
+        const isLiked = button.classList.contains('liked');
+        // PUT/DELETE are idempotent, so a double click or retry cannot double count
+        const response = await fetch(`/api/posts/${postId}/like/`, {
+            method: isLiked ? 'DELETE' : 'PUT',
             credentials: 'include',
             headers: {
                 'Accept': 'application/json',
-                'Content-Type': 'application/json',
                 'X-CSRFToken': state.csrfToken
-            },
-            body: JSON.stringify({
-                post: postId
-            })
+            }
         });
 
-        // If 201, like was created
-        if (createResponse.status === 201) {
-            likeCount.textContent = parseInt(likeCount.textContent) + 1;
-            button.classList.add('liked');
-        } 
-        // If 400, post is already liked - try to unlike
-        else if (createResponse.status === 400) {
-            const deleteResponse = await fetch(`/api/posts/${postId}/like/`, {
-                method: 'DELETE',
-                credentials: 'include',
-                headers: {
-                'Accept': 'application/json',
-                'X-CSRFToken': state.csrfToken
-                }
-            });
-
-            if (deleteResponse.ok) {
-                likeCount.textContent = parseInt(likeCount.textContent) - 1;
-                button.classList.remove('liked');
-            } else {
-                throw new Error('Failed to unlike post');
-            }
-        } 
-        // Any other status is an error
-        else {
-            throw new Error('Failed to toggle like');
+        if (!response.ok) {
+            throw new Error(isLiked ? 'Failed to unlike post' : 'Failed to like post');
         }
+
+        const data = await response.json();
+        likeCount.textContent = data.like_count;
+        button.classList.toggle('liked', data.liked);
     } catch (error) {
         console.error('Error toggling like:', error);
         alert(error.message || 'Error toggling like. Please try again.');
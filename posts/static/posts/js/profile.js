@@ -1,6 +1,13 @@
 // Get CSRF token once and store it
 let csrfToken = null;
 
+// Cursor links for the active profile tab
+const tabState = {
+    tab: 'posts',
+    nextUrl: null,
+    previousUrl: null
+};
+
 function getCsrfToken() {
     if (!csrfToken) {
         const tokenElement = document.querySelector('[name=csrfmiddlewaretoken]');
@@ -33,6 +40,20 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    // Handle tab pagination
+    const prevPage = document.getElementById('prev-page');
+    const nextPage = document.getElementById('next-page');
+    if (prevPage && !document.getElementById('posts-container')) {
+        prevPage.addEventListener('click', () => {
+            if (tabState.previousUrl) loadTabContent(tabState.tab, tabState.previousUrl);
+        });
+    }
+    if (nextPage && !document.getElementById('posts-container')) {
+        nextPage.addEventListener('click', () => {
+            if (tabState.nextUrl) loadTabContent(tabState.tab, tabState.nextUrl);
+        });
+    }
+
     // Handle tab clicks
     document.querySelectorAll('.tab-button').forEach(button => {
         button.addEventListener('click', () => {
@@ -294,7 +315,22 @@ function switchTab(tab) {
     loadTabContent(tab);
 }
 
-async function loadTabContent(tab) {
+function createGridTile(tile) {
+    const element = document.createElement('div');
+    element.className = `media-grid-item ${tile.post_type}`;
+    element.innerHTML = `
+        ${tile.thumbnail_url
+            ? `<img src="${escapeHtml(tile.thumbnail_url)}" alt="" loading="lazy">`
+            : `<div class="media-grid-placeholder">${tile.post_type === 'video' ? '&#9654;' : ''}</div>`}
+        <div class="media-grid-stats">
+            <span>${tile.like_count} Likes</span>
+            <span>${tile.comment_count} Comments</span>
+        </div>
+    `;
+    return element;
+}
+
+async function loadTabContent(tab, pageUrl) {
     const usernameEl = document.querySelector('.profile-details .username');
     if (!usernameEl) {
         console.error('Username element not found');
@@ -311,7 +347,9 @@ async function loadTabContent(tab) {
         container.innerHTML = '<div class="loading">Loading content...</div>';
         
         // Fetch data
-        const response = await fetch(`/api/profiles/${username}/posts/?tab=${tab}`, {
+        tabState.tab = tab;
+        const url = pageUrl || `/api/profiles/${username}/posts/?tab=${tab}`;
+        const response = await fetch(url, {
             credentials: 'include',
             headers: {
                 'X-CSRFToken': getCsrfToken()
@@ -323,6 +361,13 @@ async function loadTabContent(tab) {
         }
         
         const data = await response.json();
+
+        tabState.nextUrl = data.next || null;
+        tabState.previousUrl = data.previous || null;
+        const prevPage = document.getElementById('prev-page');
+        const nextPage = document.getElementById('next-page');
+        if (prevPage) prevPage.disabled = !tabState.previousUrl;
+        if (nextPage) nextPage.disabled = !tabState.nextUrl;
         
         // Update container with content
         if (!data.results || !Array.isArray(data.results)) {
@@ -337,6 +382,14 @@ async function loadTabContent(tab) {
         
         // Clear container and add posts
         container.innerHTML = '';
+        if (tab === 'media') {
+            // The media tab returns compact tiles rather than full posts
+            const grid = document.createElement('div');
+            grid.className = 'media-grid';
+            data.results.forEach(tile => grid.appendChild(createGridTile(tile)));
+            container.appendChild(grid);
+            return;
+        }
         data.results.forEach(post => {
             if (window.createPostElement) {
                 container.appendChild(window.createPostElement(post));
@@ -0,0 +1,59 @@
+"""
+Content-addressed media storage.
+
+Uploads are stored under ``blobs/<aa>/<bb>/<sha256><ext>`` instead of the
+field's upload_to name, so identical bytes map to one file. The streaming
+upload handler (and resumable assembly) already hashed the file, which is
+read from ``content.sha256``; other content is hashed here. When the blob
+already exists the write is skipped. References are counted per blob by
+posts.media_blobs, which deletes a file once nothing points at it.
+"""
+import hashlib
+import os
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+BLOB_PREFIX = 'blobs/'
+HASH_BUFFER_SIZE = 1024 * 1024
+
+
+def blob_name(digest, extension=''):
+    return f'{BLOB_PREFIX}{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(BLOB_PREFIX)
+
+
+def content_hash(content):
+    digest = getattr(content, 'sha256', None)
+    if digest:
+        return digest
+    hasher = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks(HASH_BUFFER_SIZE):
+        hasher.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return hasher.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def _save(self, name, content):
+        name = blob_name(content_hash(content), os.path.splitext(name)[1].lower())
+        if self.exists(name):
+            # Same bytes were stored before; nothing to write
+            return name
+        return super()._save(name, content)
+
+
+media_storage = ContentAddressedStorage()
+# Derivatives have names derived from their source blob and are not deduplicated
+derivative_storage = FileSystemStorage()
+
+
+def get_media_storage():
+    """Storage callable for media fields (keeps the instance out of migrations)"""
+    return media_storage
@@ -1,3 +1,1355 @@
-from django.test import TestCase
+import hashlib
+import os
+import shutil
+import tempfile
+from array import array
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import BytesIO, StringIO
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management import call_command
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, RequestFactory, AsyncRequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from django.contrib.auth.models import User, Group
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+from .models import Post, Comment, Like, UserFollow, UserProfile, TimelineEntry, UploadSession, MediaBlob
+from .pagination import KeysetPagination
+from .row_serializers import PostRowSerializer, CommentRowSerializer
+from .serializers import PostSerializer, CommentSerializer
+from .storage import blob_name
+from .media_serving import check_media_accel
+from .uploads import BodySizeLimitMiddleware
+from PIL import Image
+from . import derivatives, feed_cache, feed_delta, follow_graph, like_buffer, pubsub, resumable
+from .views import feed_events
+from .counters import reconcile_post_counters, reconcile_profile_counters
+from .ranking import refresh_scores
+from singletons.config_manager import ConfigManager
 
-# Create your tests here.
+
+class TimelineTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='testpass123')
+        self.bob = User.objects.create_user(username='bob', password='testpass123')
+        self.client = APIClient()
+        cache.clear()
+        self.client.force_authenticate(self.alice)
+
+    def test_new_post_fans_out_to_followers(self):
+        """A post by a followed author lands in the follower's timeline"""
+        UserFollow.objects.create(follower=self.alice, followed=self.bob)
+        post = Post.objects.create(author=self.bob, content='hello')
+
+        self.assertTrue(TimelineEntry.objects.filter(user=self.alice, post=post).exists())
+        self.assertFalse(TimelineEntry.objects.filter(user=self.bob).exists())
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Following copies existing posts in, unfollowing removes them"""
+        Post.objects.create(author=self.bob, content='older post')
+        follow = UserFollow.objects.create(follower=self.alice, followed=self.bob)
+        self.assertEqual(TimelineEntry.objects.filter(user=self.alice).count(), 1)
+
+        follow.delete()
+        self.assertEqual(TimelineEntry.objects.filter(user=self.alice).count(), 0)
+
+    def test_timeline_is_trimmed_to_cap(self):
+        """Timelines are trimmed back to TIMELINE_MAX_LENGTH once they pass it by TIMELINE_TRIM_SLACK"""
+        config = ConfigManager()
+        for key in ('TIMELINE_MAX_LENGTH', 'TIMELINE_TRIM_SLACK'):
+            self.addCleanup(config.set_setting, key, config.get_setting(key))
+        config.set_setting('TIMELINE_MAX_LENGTH', 2)
+        config.set_setting('TIMELINE_TRIM_SLACK', 1)
+
+        UserFollow.objects.create(follower=self.alice, followed=self.bob)
+        posts = [Post.objects.create(author=self.bob, content=f'post {i}') for i in range(3)]
+        self.assertEqual(TimelineEntry.objects.filter(user=self.alice).count(), 3)
+
+        posts.append(Post.objects.create(author=self.bob, content='post 3'))
+        kept = set(TimelineEntry.objects.filter(user=self.alice).values_list('post_id', flat=True))
+        self.assertEqual(kept, {posts[-1].id, posts[-2].id})
+
+    def test_followed_feed_reads_timeline(self):
+        """The followed feed only returns posts from followed authors"""
+        carol = User.objects.create_user(username='carol', password='testpass123')
+        UserFollow.objects.create(follower=self.alice, followed=self.bob)
+        bob_post = Post.objects.create(author=self.bob, content='from bob')
+        Post.objects.create(author=carol, content='from carol')
+
+        response = self.client.get('/api/feed/?followed=true')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([post['id'] for post in response.data['results']], [bob_post.id])
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader', password='testpass123')
+        self.client = APIClient()
+        cache.clear()
+        self.client.force_authenticate(self.user)
+        self.posts = [Post.objects.create(author=self.user, content=f'post {i}') for i in range(7)]
+
+    def test_feed_walks_forward_and_back_with_cursors(self):
+        """Cursor links visit every post once, newest first, and lead back again"""
+        first = self.client.get('/api/feed/?page_size=3').data
+        self.assertNotIn('count', first)
+        self.assertIsNone(first['previous'])
+
+        seen = [post['id'] for post in first['results']]
+        page = first
+        while page['next']:
+            page = self.client.get(page['next']).data
+            seen.extend(post['id'] for post in page['results'])
+        self.assertEqual(seen, [post.id for post in reversed(self.posts)])
+
+        back = self.client.get(page['previous']).data
+        self.assertEqual([post['id'] for post in back['results']], seen[3:6])
+
+    def test_page_number_mode_is_opt_in(self):
+        """Passing ?page= keeps the counted offset response"""
+        response = self.client.get('/api/feed/?page=2&page_size=3')
+        self.assertEqual(response.data['count'], 7)
+        self.assertEqual(len(response.data['results']), 3)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/feed/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_values_of_the_wrong_type_are_rejected(self):
+        encode = KeysetPagination().encode_cursor
+        for url in ('/api/posts/', '/api/feed/', '/api/feed/?sort=top', f'/api/posts/{self.posts[0].id}/comments/',
+                    f'/api/profiles/{self.user.username}/posts/'):
+            for values in (['garbage', 1], [None, 1], [[1], 1], ['2024-01-01T00:00:00+00:00', 'x']):
+                separator = '&' if '?' in url else '?'
+                response = self.client.get(f'{url}{separator}cursor={encode(values)}')
+                self.assertIn(response.status_code, (400, 404), (url, values))
+
+
+class PostCounterTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='testpass123')
+        self.fan = User.objects.create_user(username='fan', password='testpass123')
+        self.post = Post.objects.create(author=self.author, content='counted')
+
+    def test_counters_follow_like_and_comment_writes(self):
+        like = Like.objects.create(user=self.fan, post=self.post)
+        Comment.objects.create(author=self.fan, post=self.post, text='nice')
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (1, 1))
+
+        like.delete()
+        self.post.comments.all().delete()
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (0, 0))
+
+    def test_edit_keeps_concurrent_counter_updates(self):
+        stale = Post.objects.get(pk=self.post.pk)
+        Like.objects.create(user=self.fan, post=self.post)
+        Comment.objects.create(author=self.fan, post=self.post, text='nice')
+
+        stale.content = 'edited'
+        stale.save()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.content, 'edited')
+        self.assertEqual((self.post.like_count, self.post.comment_count), (1, 1))
+
+    def test_deleting_post_skips_per_row_counter_updates(self):
+        fans = User.objects.bulk_create([User(username=f'fan{i}') for i in range(20)])
+        Like.objects.bulk_create([Like(user=fan, post=self.post) for fan in fans])
+        Comment.objects.bulk_create([Comment(author=fan, post=self.post, text='hi') for fan in fans])
+
+        with CaptureQueriesContext(connection) as queries, \
+                self.captureOnCommitCallbacks() as callbacks:
+            self.post.delete()
+        self.assertLess(len(queries), 20)
+        self.assertLess(len(callbacks), 10)
+
+    def test_deleting_user_still_counts_likes_on_other_posts(self):
+        Like.objects.create(user=self.fan, post=self.post)
+        Comment.objects.create(author=self.fan, post=self.post, text='nice')
+        Post.objects.create(author=self.fan, content='goes too')
+
+        self.fan.delete()
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (0, 0))
+
+    def test_reconcile_repairs_drift(self):
+        Like.objects.create(user=self.fan, post=self.post)
+        Post.objects.filter(pk=self.post.pk).update(like_count=7, comment_count=3)
+
+        self.assertEqual(reconcile_post_counters(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (1, 0))
+        self.assertEqual(reconcile_post_counters(), 0)
+
+
+class ProfileCounterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='celebrity', password='testpass123')
+        self.fans = [User.objects.create_user(username=f'follower{i}', password='testpass123') for i in range(3)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.fans[0])
+
+    def counts(self, user):
+        profile = UserProfile.objects.get(user=user)
+        return profile.posts_count, profile.followers_count, profile.following_count
+
+    def test_counters_follow_post_and_follow_writes(self):
+        for fan in self.fans:
+            UserFollow.objects.create(follower=fan, followed=self.user)
+        post = Post.objects.create(author=self.user, content='hello')
+        self.assertEqual(self.counts(self.user), (1, 3, 0))
+        self.assertEqual(self.counts(self.fans[0]), (0, 0, 1))
+
+        post.delete()
+        UserFollow.objects.filter(followed=self.user, follower=self.fans[1]).delete()
+        self.assertEqual(self.counts(self.user), (0, 2, 0))
+
+    def test_profile_and_follow_toggle_do_not_count_rows(self):
+        for fan in self.fans[1:]:
+            UserFollow.objects.create(follower=fan, followed=self.user)
+
+        response = self.client.post('/api/profiles/celebrity/follow/')
+        self.assertEqual(response.data['followers_count'], 3)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/profiles/celebrity/')
+        self.assertEqual((response.data['followers_count'], response.data['posts_count']), (3, 0))
+        self.assertFalse([q for q in queries if 'COUNT(' in q['sql']])
+        self.assertEqual(self.client.delete('/api/profiles/celebrity/unfollow/').data['followers_count'], 2)
+
+    def test_user_and_profile_edits_leave_counters_alone(self):
+        stale = User.objects.get(pk=self.user.pk)
+        UserFollow.objects.create(follower=self.fans[1], followed=self.user)
+        stale.save()
+        self.assertEqual(self.counts(self.user), (0, 1, 0))
+
+        self.client.force_authenticate(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/profiles/me/', {'bio': 'hello', 'full_name': 'Big Star'})
+        self.assertEqual(response.data['bio'], 'hello')
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE')]
+        self.assertTrue(updates)
+        self.assertFalse([sql for sql in updates if 'followers_count' in sql or 'last_login' in sql])
+
+    def test_reconcile_repairs_drift(self):
+        UserFollow.objects.create(follower=self.fans[0], followed=self.user)
+        UserProfile.objects.filter(user=self.user).update(posts_count=5, followers_count=0)
+
+        self.assertEqual(reconcile_profile_counters(), 1)
+        self.assertEqual(self.counts(self.user), (0, 1, 0))
+        self.assertEqual(reconcile_profile_counters(), 0)
+
+
+class FollowSuggestionTests(TestCase):
+    def setUp(self):
+        self.users = {name: User.objects.create_user(username=name, password='testpass123')
+                      for name in ('me', 'ann', 'bob', 'cat', 'dan', 'eve')}
+        follow_graph.index.reset()
+        self.addCleanup(follow_graph.index.reset)
+        self.client = APIClient()
+        self.client.force_authenticate(self.users['me'])
+
+    def follow(self, follower, followed):
+        with self.captureOnCommitCallbacks(execute=True):
+            return UserFollow.objects.create(follower=self.users[follower], followed=self.users[followed])
+
+    def suggested(self):
+        return [(item['username'], item['mutual_count'])
+                for item in self.client.get('/api/profiles/me/suggestions/').data['results']]
+
+    def test_ranks_friends_of_friends_by_mutual_follows(self):
+        for follower, followed in (('me', 'ann'), ('me', 'bob'), ('ann', 'cat'), ('bob', 'cat'),
+                                   ('ann', 'dan'), ('ann', 'bob'), ('eve', 'dan')):
+            self.follow(follower, followed)
+        self.assertEqual(self.suggested(), [('cat', 2), ('dan', 1)])
+
+    def test_follows_update_the_built_graph_incrementally(self):
+        self.follow('me', 'ann')
+        self.follow('ann', 'cat')
+        self.assertEqual(self.suggested(), [('cat', 1)])
+
+        self.follow('me', 'cat')
+        self.follow('ann', 'dan')
+        with self.captureOnCommitCallbacks(execute=True):
+            UserFollow.objects.filter(follower=self.users['me'], followed=self.users['ann']).delete()
+        self.follow('me', 'bob')
+        self.follow('bob', 'dan')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.suggested(), [('dan', 1)])
+        self.assertFalse([q for q in queries if 'posts_userfollow' in q['sql']])
+
+    def test_csr_graph(self):
+        graph = follow_graph.FollowGraph(array('q', [1, 1, 2, 3]), array('q', [2, 3, 3, 1]))
+        self.assertEqual(list(graph.following(1)), [2, 3])
+        self.assertEqual(list(graph.followers(3)), [1, 2])
+        self.assertEqual(list(graph.following(99)), [])
+        graph.remove_edge(1, 3)
+        graph.add_edge(1, 4)
+        self.assertEqual(graph.following(1), {2, 4})
+        self.assertEqual(graph.follower_count(3), 1)
+
+
+class ProfileTabTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='tabby', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.old = Post.objects.create(author=self.user, content='old')
+        self.new = Post.objects.create(author=self.user, content='new')
+
+    def test_liked_tab_is_ordered_by_like_time_and_paginated(self):
+        Like.objects.create(user=self.user, post=self.new)
+        Like.objects.create(user=self.user, post=self.old)
+
+        first = self.client.get('/api/profiles/tabby/posts/?tab=liked&page_size=1').data
+        self.assertEqual([post['id'] for post in first['results']], [self.old.id])
+        second = self.client.get(first['next']).data
+        self.assertEqual([post['id'] for post in second['results']], [self.new.id])
+        self.assertIsNone(second['next'])
+
+    def test_media_tab_returns_grid_tiles(self):
+        Post.objects.filter(pk=self.new.pk).update(post_type='video')
+        results = self.client.get('/api/profiles/tabby/posts/?tab=media').data['results']
+        self.assertEqual(results, [{'id': self.new.id, 'post_type': 'video', 'thumbnail_url': None,
+                                    'like_count': 0, 'comment_count': 0}])
+
+
+class FeedQueryBudgetTests(TestCase):
+    def setUp(self):
+        self.viewer = User.objects.create_user(username='viewer', password='testpass123')
+        self.client = APIClient()
+        cache.clear()
+        self.client.force_authenticate(self.viewer)
+
+    def _feed_queries(self, page_size):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/feed/?page_size={page_size}')
+        self.assertEqual(len(response.data['results']), page_size)
+        return response, len(queries)
+
+    def test_viewer_fields_cost_constant_queries(self):
+        """Viewer-specific fields are resolved per page, not per post"""
+        for i in range(12):
+            author = User.objects.create_user(username=f'author{i}', password='testpass123')
+            post = Post.objects.create(author=author, content=f'post {i}')
+            if i % 2:
+                UserFollow.objects.create(follower=self.viewer, followed=author)
+                Like.objects.create(user=self.viewer, post=post)
+
+        _, small = self._feed_queries(3)
+        response, large = self._feed_queries(12)
+        self.assertEqual(small, large)
+
+        for post in response.data['results']:
+            expected = int(post['content'].split()[-1]) % 2 == 1
+            self.assertEqual(post['is_following'], expected)
+            self.assertEqual(post['liked_by_me'], expected)
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        self.viewer = User.objects.create_user(username='skimmer', password='testpass123')
+        self.author = User.objects.create_user(username='prolific', password='testpass123')
+        UserFollow.objects.create(follower=self.viewer, followed=self.author)
+        self.post = Post.objects.create(author=self.author, content='hello')
+        Comment.objects.create(author=self.viewer, post=self.post, text='hi')
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+        cache.clear()
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data, ' '.join(q['sql'] for q in queries)
+
+    def test_feed_skips_unrequested_lookups(self):
+        data, sql = self.get('/api/feed/?fields=id,like_count')
+        self.assertEqual(data['results'], [{'id': self.post.id, 'like_count': 0}])
+        for table in ('posts_comment', 'posts_userfollow', 'posts_like', 'auth_group'):
+            self.assertNotIn(table, sql)
+        self.assertNotIn('INNER JOIN "auth_user"', sql)
+
+        data, sql = self.get('/api/posts/?omit=comment_previews,is_following')
+        self.assertNotIn('comment_previews', data['results'][0])
+        self.assertIn('author_username', data['results'][0])
+        self.assertNotIn('posts_comment', sql)
+        self.assertNotIn('posts_userfollow', sql)
+
+    def test_detail_comments_and_profile(self):
+        data, _ = self.get(f'/api/posts/{self.post.id}/?fields=id,liked_by_me')
+        self.assertEqual(data, {'id': self.post.id, 'liked_by_me': False})
+
+        data, sql = self.get(f'/api/posts/{self.post.id}/comments/?fields=id,text')
+        self.assertEqual([set(comment) for comment in data['results']], [{'id', 'text'}])
+        self.assertNotIn('"auth_user"."username"', sql.split('FROM "posts_comment"')[0])
+
+        data, sql = self.get('/api/profiles/prolific/?fields=username,followers_count')
+        self.assertEqual(data, {'username': 'prolific', 'followers_count': 1})
+        self.assertNotIn('posts_userfollow', sql)
+
+    def test_writes_keep_every_field(self):
+        response = self.client.post('/api/posts/?fields=id', {'title': 't', 'content': 'c', 'post_type': 'text'})
+        self.assertIn('comment_previews', response.data)
+
+
+class RowSerializerTests(TestCase):
+    """The values()-based read path renders exactly what the DRF serializers do"""
+
+    def setUp(self):
+        self.viewer = User.objects.create_user(username='reader', password='testpass123')
+        self.author = User.objects.create_user(username='writer', password='testpass123')
+        UserFollow.objects.create(follower=self.viewer, followed=self.author)
+        image = blob_name(hashlib.sha256(b'photo').hexdigest(), '.png')
+        MediaBlob.objects.create(name=image, size=5, derivatives={'variants': [
+            {'name': 'derivatives/320w.webp', 'width': 320, 'format': 'webp'},
+            {'name': 'derivatives/320w.jpeg', 'width': 320, 'format': 'jpeg'},
+        ]})
+        posts = [
+            Post.objects.create(author=self.author, title='Hi', content='text', metadata={'tags': ['a', 1]}),
+            Post.objects.create(author=self.viewer, content='mine', metadata={'url': 'https://example.com'}),
+            Post.objects.create(author=self.author, content='pending image'),
+            Post.objects.create(author=self.author, content='image'),
+        ]
+        # Media names are set directly: the files themselves are never read
+        Post.objects.filter(pk=posts[2].pk).update(post_type='image', media='post_media/plain.png')
+        Post.objects.filter(pk=posts[3].pk).update(post_type='image', media=image)
+        for post in posts[:2]:
+            Like.objects.create(user=self.viewer, post=post)
+            Comment.objects.create(author=self.viewer, post=post, text=f'on {post.pk}')
+        self.posts = Post.objects.filter(pk__in=[post.pk for post in posts]).order_by('-created_at', '-id')
+
+    def request(self, query=''):
+        request = Request(RequestFactory().get(f'/api/feed/{query}'))
+        request.user = self.viewer
+        return request
+
+    def assertSameJSON(self, serializer_class, objects, rows):
+        expected = JSONRenderer().render(serializer_class(objects, many=True, context={'request': rows.request}).data)
+        self.assertEqual(JSONRenderer().render(rows.serialize(rows.values(self.queryset))), expected)
+
+    def test_posts_match_post_serializer(self):
+        for query in ('', '?fields=id,media,media_srcset,liked_by_me', '?omit=comment_previews,content,author'):
+            with self.subTest(query=query):
+                self.queryset = self.posts
+                self.assertSameJSON(PostSerializer, list(self.posts), PostRowSerializer(self.request(query)))
+
+    def test_liked_posts_through_likes(self):
+        self.queryset = Like.objects.filter(user=self.viewer).order_by('-created_at', '-id')
+        rows = PostRowSerializer(self.request(), prefix='post__')
+        self.assertSameJSON(PostSerializer, [like.post for like in self.queryset], rows)
+
+    def test_comments_match_comment_serializer(self):
+        for query in ('', '?fields=id,author_username'):
+            with self.subTest(query=query):
+                self.queryset = Comment.objects.order_by('created_at', 'id')
+                self.assertSameJSON(CommentSerializer, list(self.queryset), CommentRowSerializer(self.request(query)))
+
+    def test_feed_query_selects_only_needed_columns(self):
+        client = APIClient()
+        client.force_authenticate(self.viewer)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/feed/?fields=id,like_count&page_size=2')
+        self.assertEqual(len(response.data['results']), 2)
+        feed_sql = queries[-1]['sql']
+        self.assertNotIn('"content"', feed_sql)
+        self.assertNotIn('"metadata"', feed_sql)
+        self.assertEqual(client.get(response.data['next']).data['results'][0]['id'], self.posts[2].id)
+
+
+class CommentPreviewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='commenter', password='testpass123')
+        self.client = APIClient()
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def test_feed_embeds_only_latest_comments(self):
+        """Each post carries the latest COMMENT_PREVIEW_COUNT comments, oldest of them first"""
+        limit = ConfigManager().get_setting('COMMENT_PREVIEW_COUNT')
+        posts = [Post.objects.create(author=self.user, content=f'post {i}') for i in range(3)]
+        for post in posts:
+            for i in range(limit + 2):
+                Comment.objects.create(author=self.user, post=post, text=f'{post.id}-{i}')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/feed/')
+        comment_queries = [q for q in queries.captured_queries if 'posts_comment' in q['sql']]
+        self.assertEqual(len(comment_queries), 1)
+
+        for post in response.data['results']:
+            texts = [preview['text'] for preview in post['comment_previews']]
+            self.assertEqual(texts, [f"{post['id']}-{i}" for i in range(2, limit + 2)])
+            self.assertEqual(post['comment_previews'][0]['author_username'], 'commenter')
+
+
+class FeedCacheTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='cached', password='testpass123')
+        self.other = User.objects.create_user(username='other', password='testpass123')
+        self.post = Post.objects.create(author=self.other, content='cached post')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        cache.clear()
+
+    def test_repeat_request_is_served_from_cache(self):
+        self.client.get('/api/feed/?_=1')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/feed/?_=2')
+        self.assertEqual(response.data['results'][0]['id'], self.post.id)
+        self.assertFalse([q for q in queries.captured_queries if 'posts_post' in q['sql']])
+        self.assertEqual(feed_cache.stats()['hits'], 1)
+
+    def test_like_invalidates_pages_holding_the_post(self):
+        self.client.get('/api/feed/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.create(user=self.other, post=self.post)
+
+        response = self.client.get('/api/feed/')
+        self.assertEqual(response.data['results'][0]['like_count'], 1)
+        self.assertEqual(feed_cache.stats()['misses'], 2)
+
+    def test_post_change_invalidates_every_holder_and_their_etags(self):
+        """Pages carry their posts' versions, so no per-post list of viewers is kept"""
+        reader = APIClient()
+        reader.force_authenticate(self.other)
+        etags = [client.get('/api/feed/')['ETag'] for client in (self.client, reader)]
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(author=self.other, post=self.post, text='new')
+
+        for client, etag in zip((self.client, reader), etags):
+            refreshed = client.get('/api/feed/')
+            self.assertEqual(refreshed.data['results'][0]['comment_count'], 1)
+            self.assertNotEqual(refreshed['ETag'], etag)
+            self.assertEqual(client.get('/api/feed/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+            self.assertEqual(client.get('/api/feed/', HTTP_IF_NONE_MATCH=refreshed['ETag']).status_code, 304)
+        self.assertEqual(feed_cache.stats()['misses'], 4)
+
+    def test_new_post_invalidates_unfiltered_feed(self):
+        self.client.get('/api/feed/')
+        with self.captureOnCommitCallbacks(execute=True):
+            newer = Post.objects.create(author=self.other, content='newer post')
+
+        response = self.client.get('/api/feed/')
+        self.assertEqual(response.data['results'][0]['id'], newer.id)
+
+    def test_stats_are_admin_only(self):
+        self.assertEqual(self.client.get('/api/feed/cache-stats/').status_code, 403)
+        self.user.groups.add(Group.objects.create(name='Admin'))
+        self.assertIn('hit_ratio', self.client.get('/api/feed/cache-stats/').data)
+
+
+class TopFeedTests(TestCase):
+    def setUp(self):
+        self.viewer = User.objects.create_user(username='ranker', password='testpass123')
+        self.author = User.objects.create_user(username='popular', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+        cache.clear()
+
+    def test_engagement_outranks_recency_after_refresh(self):
+        liked = Post.objects.create(author=self.author, content='liked')
+        Post.objects.create(author=self.author, content='newer but quiet')
+        fans = [User.objects.create_user(username=f'fan{i}') for i in range(20)]
+        Like.objects.bulk_create([Like(user=fan, post=liked) for fan in fans])
+        Post.objects.filter(pk=liked.pk).update(like_count=20, score_dirty=True)
+
+        self.assertEqual(refresh_scores(), 1)
+        self.assertEqual(refresh_scores(), 0)
+
+        response = self.client.get('/api/feed/?sort=top')
+        self.assertEqual(response.data['results'][0]['id'], liked.id)
+
+    def test_followed_authors_are_boosted(self):
+        stranger = User.objects.create_user(username='stranger')
+        followed_post = Post.objects.create(author=self.author, content='followed')
+        Post.objects.create(author=stranger, content='newer stranger post')
+        UserFollow.objects.create(follower=self.viewer, followed=self.author)
+
+        response = self.client.get('/api/feed/?sort=top')
+        self.assertEqual(response.data['results'][0]['id'], followed_post.id)
+
+    def test_top_feed_cursor_pages(self):
+        for i in range(5):
+            Post.objects.create(author=self.author, content=f'post {i}')
+        first = self.client.get('/api/feed/?sort=top&page_size=3').data
+        second = self.client.get(first['next']).data
+        ids = [post['id'] for post in first['results'] + second['results']]
+        self.assertEqual(len(set(ids)), 5)
+
+
+    def test_windowed_pages_match_a_full_rank_sort(self):
+        """Pages read from score windows equal sorting every post by rank, in both directions"""
+        stranger = User.objects.create_user(username='stranger')
+        UserFollow.objects.create(follower=self.viewer, followed=self.author)
+        boost = ConfigManager().get_setting('RANK_FOLLOWED_BOOST')
+        expected = []
+        for i in range(40):
+            author = self.author if i % 3 else stranger
+            post = Post.objects.create(author=author, content=f'post {i}')
+            # Scores crowded within a few boosts of each other, with ties
+            score = (i * 7 % 23) * boost / 4
+            Post.objects.filter(pk=post.pk).update(score=score)
+            expected.append((score + (boost if author == self.author else 0), post.id))
+        expected = [post_id for _, post_id in sorted(expected, reverse=True)]
+
+        pages, url = [], '/api/feed/?sort=top&page_size=6&fields=id'
+        while url:
+            page = self.client.get(url).data
+            pages.append([post['id'] for post in page['results']])
+            url = page['next']
+        self.assertEqual(sum(pages, []), expected)
+
+        previous = self.client.get(page['previous']).data
+        self.assertEqual([post['id'] for post in previous['results']], pages[-2])
+
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/feed/?sort=top&page_size=6&fields=id')
+        self.assertTrue(any('"score" >=' in query['sql'] for query in queries))
+
+
+class FeedDeltaTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='poller', password='testpass123')
+        self.other = User.objects.create_user(username='poster', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        cache.clear()
+        config = ConfigManager()
+        self.addCleanup(config.set_setting, 'FEED_DELTA_OVERLAP', config.get_setting('FEED_DELTA_OVERLAP'))
+        config.set_setting('FEED_DELTA_OVERLAP', 0)
+        self.held = Post.objects.create(author=self.other, content='already loaded')
+        self.token = self.client.get('/api/feed/').data['since']
+
+    def test_returns_new_posts_and_counter_updates(self):
+        newer = Post.objects.create(author=self.other, content='fresh')
+        Like.objects.create(user=self.other, post=self.held)
+
+        data = self.client.get(f'/api/feed/?since={self.token}&ids={self.held.id}').data
+        self.assertEqual([post['id'] for post in data['posts']], [newer.id])
+        self.assertEqual(data['updates'], [{'id': self.held.id, 'like_count': 1, 'comment_count': 0}])
+
+        again = self.client.get(f"/api/feed/?since={data['since']}&ids={self.held.id},{newer.id}").data
+        self.assertEqual((again['posts'], again['updates']), ([], []))
+
+    def test_idle_poll_is_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(f'/api/feed/?since={self.token}&ids={self.held.id}').data
+        self.assertEqual((data['posts'], data['updates']), ([], []))
+        self.assertEqual(len([q for q in queries.captured_queries if 'posts_post' in q['sql']]), 1)
+
+    def test_bad_token_is_rejected(self):
+        self.assertEqual(self.client.get('/api/feed/?since=garbage').status_code, 400)
+
+    def test_rows_committed_after_the_token_are_picked_up(self):
+        """A lower id or an activity_at stamped before the token, made visible only after it"""
+        ConfigManager().set_setting('FEED_DELTA_OVERLAP', 30)
+        late = Post.objects.create(author=self.other, content='committed late')
+        stamped = timezone.now() - timedelta(seconds=5)
+        Post.objects.filter(pk=self.held.pk).update(like_count=1, activity_at=stamped)
+        token = feed_delta.encode_token(late.id + 1, timezone.now())
+
+        data = self.client.get(f'/api/feed/?since={token}&ids={self.held.id}').data
+        self.assertEqual([post['id'] for post in data['posts']], [late.id])
+        self.assertEqual(data['updates'], [{'id': self.held.id, 'like_count': 1, 'comment_count': 0}])
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='revalidator', password='testpass123')
+        self.other = User.objects.create_user(username='writer', password='testpass123')
+        self.post = Post.objects.create(author=self.other, content='stable')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        cache.clear()
+
+    def assert_revalidates(self, url, change):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+
+        with CaptureQueriesContext(connection) as queries:
+            repeat = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(repeat.status_code, 304)
+        self.assertEqual(repeat['ETag'], etag)
+        self.assertLessEqual(len(queries), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_post_detail(self):
+        self.assert_revalidates(f'/api/posts/{self.post.id}/',
+                                lambda: Like.objects.create(user=self.other, post=self.post))
+
+    def test_post_comments(self):
+        self.assert_revalidates(f'/api/posts/{self.post.id}/comments/',
+                                lambda: Comment.objects.create(author=self.other, post=self.post, text='hi'))
+
+    def test_profile(self):
+        self.assert_revalidates('/api/profiles/writer/',
+                                lambda: UserFollow.objects.create(follower=self.user, followed=self.other))
+
+    def test_feed(self):
+        self.assert_revalidates('/api/feed/',
+                                lambda: Post.objects.create(author=self.other, content='new'))
+
+    def test_viewer_specific_responses_ignore_if_modified_since(self):
+        for url, change in ((f'/api/posts/{self.post.id}/', lambda: Like.objects.create(user=self.user, post=self.post)),
+                            ('/api/profiles/writer/', lambda: UserFollow.objects.create(follower=self.user, followed=self.other))):
+            first = self.client.get(url)
+            self.assertNotIn('Last-Modified', first)
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+            later = self.client.get(url, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+            self.assertEqual(later.status_code, 200)
+
+    def test_viewer_state_revalidates_without_shared_cache(self):
+        """A like or follow handled by another process only shows in the database, not our cache"""
+        for url, change in ((f'/api/posts/{self.post.id}/', lambda: Like.objects.create(user=self.user, post=self.post)),
+                            ('/api/profiles/writer/', lambda: UserFollow.objects.create(follower=self.user, followed=self.other))):
+            etag = self.client.get(url)['ETag']
+            with self.captureOnCommitCallbacks(execute=False):
+                change()
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_profile_etag_follows_viewer_not_follower_count(self):
+        UserFollow.objects.create(follower=self.user, followed=self.other)
+        first = self.client.get('/api/profiles/writer/')
+        self.assertTrue(first.data['is_following'])
+
+        third = User.objects.create_user(username='bystander', password='testpass123')
+        with self.captureOnCommitCallbacks(execute=True):
+            UserFollow.objects.filter(follower=self.user, followed=self.other).delete()
+            UserFollow.objects.create(follower=third, followed=self.other)
+        repeat = self.client.get('/api/profiles/writer/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(repeat.status_code, 200)
+        self.assertFalse(repeat.data['is_following'])
+
+
+class LiveEventTests(TestCase):
+    def setUp(self):
+        self.reader = User.objects.create_user(username='listener', password='testpass123')
+        self.writer = User.objects.create_user(username='broadcaster', password='testpass123')
+        UserFollow.objects.create(follower=self.reader, followed=self.writer)
+        self.post = Post.objects.create(author=self.writer, content='live')
+
+    def stream_request(self, query=''):
+        request = AsyncRequestFactory().get(f'/api/events/{query}')
+
+        async def auser():
+            return self.reader
+        request.auser = auser
+        return request
+
+    def test_saves_publish_after_commit(self):
+        events = []
+        broker = pubsub.get_broker()
+        original, broker.publish = broker.publish, lambda channel, event: events.append((channel, event))
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                new_post = Post.objects.create(author=self.writer, content='fresh')
+                Like.objects.create(user=self.reader, post=self.post)
+                Comment.objects.create(author=self.reader, post=self.post, text='hi')
+        finally:
+            broker.publish = original
+
+        self.assertEqual(events, [
+            (f'author:{self.writer.id}', {'type': 'post', 'id': new_post.id, 'author': self.writer.id}),
+            (f'post:{self.post.id}', {'type': 'like', 'post': self.post.id, 'delta': 1}),
+            (f'post:{self.post.id}', {'type': 'comment', 'post': self.post.id, 'delta': 1}),
+        ])
+
+    async def test_stream_delivers_subscribed_events(self):
+        response = await feed_events(self.stream_request(f'?posts={self.post.id}'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 5000\n\n')
+
+        pubsub.publish(f'post:{self.post.id}', {'type': 'like', 'post': self.post.id, 'delta': 1})
+        pubsub.publish('post:0', {'type': 'like', 'post': 0, 'delta': 1})
+        pubsub.publish(f'author:{self.writer.id}', {'type': 'post', 'id': 99, 'author': self.writer.id})
+
+        self.assertEqual(await anext(stream),
+                         b'event: like\ndata: {"type": "like", "post": %d, "delta": 1}\n\n' % self.post.id)
+        self.assertTrue((await anext(stream)).startswith(b'event: post\n'))
+        await stream.aclose()
+
+    async def test_stream_requires_authentication(self):
+        self.assertEqual((await self.async_client.get('/api/events/')).status_code, 401)
+
+    def test_stream_is_refused_under_wsgi(self):
+        self.client.force_login(self.reader)
+        self.assertEqual(self.client.get('/api/events/').status_code, 501)
+
+
+class PostListingTests(TestCase):
+    def setUp(self):
+        self.viewer = User.objects.create_user(username='browser', password='testpass123')
+        self.author = User.objects.create_user(username='poster', password='testpass123')
+        self.other = User.objects.create_user(username='bystander', password='testpass123')
+        self.posts = [
+            Post.objects.create(author=self.author if i % 2 else self.other, content=f'post {i}')
+            for i in range(8)
+        ]
+        # Image posts need media to pass clean(); the listing only cares about the column
+        for post in self.posts[::3]:
+            post.post_type = 'image'
+        Post.objects.filter(pk__in=[post.pk for post in self.posts[::3]]).update(post_type='image')
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def collect(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [post['id'] for post in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_cursor_pages_cover_every_post_newest_first(self):
+        self.assertEqual(self.collect('/api/posts/?page_size=3'),
+                         [post.id for post in reversed(self.posts)])
+
+    def test_filters(self):
+        expected = [post.id for post in reversed(self.posts)
+                    if post.author_id == self.author.id and post.post_type == 'image']
+        self.assertEqual(self.collect('/api/posts/?author=poster&post_type=image'), expected)
+        self.assertEqual(self.collect(f'/api/posts/?author={self.author.id}&post_type=image'), expected)
+        self.assertEqual(self.collect('/api/posts/?author=nobody'), [])
+
+        Post.objects.filter(pk=self.posts[0].pk).update(created_at=datetime(2024, 1, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(self.collect('/api/posts/?created_before=2024-06-01'), [self.posts[0].id])
+        self.assertNotIn(self.posts[0].id, self.collect('/api/posts/?created_after=2024-06-01T00:00:00Z'))
+
+    def test_invalid_filters_are_rejected(self):
+        self.assertEqual(self.client.get('/api/posts/?post_type=audio').status_code, 400)
+        self.assertEqual(self.client.get('/api/posts/?created_after=yesterday').status_code, 400)
+
+    def test_page_queries_do_not_grow_with_page_size(self):
+        for post in self.posts:
+            Like.objects.create(user=self.viewer, post=post)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get('/api/posts/?page_size=2')
+        with CaptureQueriesContext(connection) as large:
+            self.client.get('/api/posts/?page_size=8')
+        self.assertEqual(len(small), len(large))
+
+
+class BulkPostTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='importer', password='testpass123')
+        self.follower = User.objects.create_user(username='subscriber', password='testpass123')
+        UserFollow.objects.create(follower=self.follower, followed=self.author)
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def test_valid_items_are_created_and_invalid_ones_reported(self):
+        items = [
+            {'title': 'one', 'content': 'first'},
+            {'content': 'x' * 6000},
+            {'title': 'three', 'content': 'third', 'metadata': {'source': 'import'}},
+            {'content': 'no media', 'post_type': 'image'},
+            {'content': 'bad', 'likes': 3},
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/posts/bulk/', items, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([item['index'] for item in response.data['created']], [0, 2])
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 3, 4])
+
+        created = Post.objects.filter(author=self.author).order_by('id')
+        self.assertEqual([post.content for post in created], ['first', 'third'])
+        self.assertEqual([item['id'] for item in response.data['created']], [post.id for post in created])
+        self.assertFalse(any(post.score_dirty for post in created))
+        self.assertEqual(TimelineEntry.objects.filter(user=self.follower).count(), 2)
+
+    def test_batch_insert_queries_do_not_grow_per_item(self):
+        def create(count):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.post('/api/posts/bulk/', [{'content': f'post {i}'} for i in range(count)],
+                                 format='json')
+            return len(queries)
+        self.assertEqual(create(2), create(20))
+
+    def test_bad_values_are_per_item_errors(self):
+        items = [
+            {'content': 'ok'},
+            {'content': 'image', 'post_type': 'image', 'media': 'nope/missing.png'},
+            {'content': 'escape', 'post_type': 'image', 'media': '../../etc/passwd.png'},
+            {'content': None},
+            {'content': 'unknown type', 'post_type': 'poll'},
+        ]
+        response = self.client.post('/api/posts/bulk/', items, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([item['index'] for item in response.data['created']], [0])
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2, 3, 4])
+        self.assertIn('Unknown fields: media', response.data['errors'][0]['errors'])
+
+    def test_rejects_everything_invalid(self):
+        self.assertEqual(self.client.post('/api/posts/bulk/', [{'content': ''}], format='json').status_code, 400)
+        self.assertEqual(self.client.post('/api/posts/bulk/', {'posts': []}, format='json').status_code, 400)
+
+
+class LikeToggleTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='poster', password='testpass123')
+        self.fan = User.objects.create_user(username='fan', password='testpass123')
+        self.post = Post.objects.create(author=self.author, title='t', content='c')
+        self.client = APIClient()
+        self.client.force_authenticate(self.fan)
+        self.url = f'/api/posts/{self.post.id}/like/'
+
+    def test_put_and_delete_are_idempotent(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put(self.url)
+        self.assertEqual(response.data, {'liked': True, 'changed': True, 'like_count': 1})
+        # Conflict-tolerant insert, counter update and count read
+        self.assertEqual(sum('posts_like' in q['sql'] or 'posts_post' in q['sql'] for q in queries), 3)
+
+        self.assertEqual(self.client.put(self.url).data, {'liked': True, 'changed': False, 'like_count': 1})
+        self.assertEqual(Like.objects.filter(post=self.post).count(), 1)
+
+        self.assertEqual(self.client.delete(self.url).data, {'liked': False, 'changed': True, 'like_count': 0})
+        self.assertEqual(self.client.delete(self.url).data, {'liked': False, 'changed': False, 'like_count': 0})
+        self.assertFalse(Like.objects.exists())
+
+    def test_missing_post(self):
+        self.assertEqual(self.client.put('/api/posts/999999/like/').status_code, 404)
+        self.assertFalse(Like.objects.exists())
+
+
+class WriteBehindLikeTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='viral', password='testpass123')
+        self.post = Post.objects.create(author=self.author, title='t', content='c')
+        self.fans = [User.objects.create_user(username=f'fan{i}', password='testpass123') for i in range(3)]
+        self.url = f'/api/posts/{self.post.id}/like/'
+        write_behind = override_settings(LIKE_COUNT_WRITE_BEHIND=True)
+        write_behind.enable()
+        self.addCleanup(write_behind.disable)
+        config = ConfigManager()
+        for key, value in (('LIKE_FLUSH_INTERVAL', 0), ('LIKE_FLUSH_THRESHOLD', 100)):
+            self.addCleanup(config.set_setting, key, config.get_setting(key))
+            config.set_setting(key, value)
+        self.addCleanup(setattr, like_buffer, 'buffer', like_buffer.buffer)
+        like_buffer.buffer = like_buffer.LikeCountBuffer()
+
+    def like(self, user, method='put'):
+        client = APIClient()
+        client.force_authenticate(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            return getattr(client, method)(self.url).data
+
+    def stored_count(self):
+        return Post.objects.get(pk=self.post.pk).like_count
+
+    def test_counts_are_buffered_and_flushed_in_one_update(self):
+        for fan in self.fans:
+            self.like(fan)
+        self.like(self.fans[0], 'delete')
+        self.assertEqual(self.stored_count(), 0)
+        self.assertEqual(self.like(self.fans[0], 'delete')['like_count'], 2)
+
+        client = APIClient()
+        client.force_authenticate(self.author)
+        self.assertEqual(client.get(f'/api/posts/{self.post.id}/').data['like_count'], 2)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(like_buffer.buffer.flush(), 1)
+        self.assertEqual(sum(q['sql'].startswith('UPDATE') for q in queries), 1)
+        self.assertEqual(self.stored_count(), 2)
+        self.assertEqual(like_buffer.pending(self.post.pk), 0)
+
+    def test_threshold_triggers_flush(self):
+        ConfigManager().set_setting('LIKE_FLUSH_THRESHOLD', 2)
+        self.like(self.fans[0])
+        self.assertEqual(self.stored_count(), 0)
+        self.like(self.fans[1])
+        self.assertEqual(self.stored_count(), 2)
+
+    def test_lost_buffer_is_rebuilt_from_like_rows(self):
+        for fan in self.fans:
+            self.like(fan)
+        like_buffer.buffer = like_buffer.LikeCountBuffer()  # the worker died before flushing
+        self.assertEqual(reconcile_post_counters(), 1)
+        self.assertEqual(self.stored_count(), 3)
+
+
+class PostCreateWriteTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='uploader', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+    def test_media_post_is_inserted_once(self):
+        image = SimpleUploadedFile('pic.gif', b'GIF89a', content_type='image/gif')
+        with override_settings(MEDIA_ROOT=self.media_root), CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/posts/', {
+                'title': 'pic', 'content': 'one write', 'post_type': 'image', 'media': image
+            }, format='multipart')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['author'], self.author.id)
+        writes = [q['sql'] for q in queries if q['sql'].startswith(('INSERT INTO "posts_post"', 'UPDATE "posts_post"'))]
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(Post.objects.get().media.name, blob_name(hashlib.sha256(b'GIF89a').hexdigest(), '.gif'))
+        self.assertEqual(sum(len(files) for _, _, files in os.walk(self.media_root)), 1)
+        self.assertEqual(Post.objects.get().metadata['file_type'], 'gif')
+
+    def test_author_cannot_be_chosen_by_client(self):
+        other = User.objects.create_user(username='impersonated', password='testpass123')
+        response = self.client.post('/api/posts/', {'content': 'mine', 'author': other.id}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Post.objects.get().author, self.author)
+
+
+class StreamingUploadTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='streamer', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        config = ConfigManager()
+        self.addCleanup(config.set_setting, 'MAX_FILE_SIZE', config.get_setting('MAX_FILE_SIZE'))
+
+    def test_uploads_are_spooled_to_disk_and_hashed(self):
+        payload = b'\x00' * 300000
+        request = RequestFactory().post('/api/posts/', {
+            'media': SimpleUploadedFile('clip.mp4', payload, content_type='video/mp4')
+        })
+        upload = request.FILES['media']
+        self.assertTrue(os.path.exists(upload.temporary_file_path()))
+        self.assertEqual(upload.size, len(payload))
+        self.assertEqual(upload.sha256, hashlib.sha256(payload).hexdigest())
+
+    def test_oversize_upload_is_rejected(self):
+        ConfigManager().set_setting('MAX_FILE_SIZE', 1024)
+        with override_settings(MEDIA_ROOT=self.media_root):
+            response = self.client.post('/api/posts/', {
+                'content': 'too big', 'post_type': 'video',
+                'media': SimpleUploadedFile('clip.mp4', b'\x00' * 4096, content_type='video/mp4')
+            }, format='multipart')
+
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(Post.objects.exists())
+        self.assertEqual(os.listdir(self.media_root), [])
+
+    def test_oversize_upload_on_update_is_rejected(self):
+        post = Post.objects.create(author=self.author, content='original')
+        ConfigManager().set_setting('MAX_FILE_SIZE', 1024)
+        with override_settings(MEDIA_ROOT=self.media_root):
+            response = self.client.put(f'/api/posts/{post.id}/', {
+                'content': 'edited',
+                'media': SimpleUploadedFile('clip.mp4', b'\x00' * 4096, content_type='video/mp4')
+            }, format='multipart')
+
+        self.assertEqual(response.status_code, 413)
+        post.refresh_from_db()
+        self.assertEqual(post.content, 'original')
+
+    def test_asgi_bodies_over_the_limit_are_rejected_before_reading(self):
+        ConfigManager().set_setting('MAX_FILE_SIZE', 1024)
+        limit = 1024 + settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+        body_reads = []
+
+        async def app(scope, receive, send):
+            while (message := await receive())['type'] == 'http.request':
+                body_reads.append(len(message['body']))
+                if not message.get('more_body'):
+                    await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+                    await send({'type': 'http.response.body', 'body': b''})
+                    return
+
+        def call(headers, chunks):
+            messages = iter([{'type': 'http.request', 'body': chunk, 'more_body': True} for chunk in chunks]
+                            + [{'type': 'http.request', 'body': b'', 'more_body': False}])
+            sent = []
+
+            async def receive():
+                return next(messages)
+
+            async def send(message):
+                sent.append(message)
+            async_to_sync(BodySizeLimitMiddleware(app))({'type': 'http', 'headers': headers}, receive, send)
+            return sent[0]['status']
+
+        self.assertEqual(call([(b'content-length', str(limit + 1).encode())], [b'x' * 10]), 413)
+        self.assertEqual(body_reads, [])
+        self.assertEqual(call([], [b'x' * (limit // 2)] * 3), 413)
+        self.assertEqual(call([(b'content-length', b'10')], [b'x' * 10]), 200)
+
+
+class ResumableUploadTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='resumer', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        self.media_root = os.path.join(root, 'media')
+        paths = override_settings(MEDIA_ROOT=self.media_root, UPLOAD_SESSION_ROOT=os.path.join(root, 'sessions'))
+        paths.enable()
+        self.addCleanup(paths.disable)
+        config = ConfigManager()
+        self.addCleanup(config.set_setting, 'UPLOAD_CHUNK_SIZE', config.get_setting('UPLOAD_CHUNK_SIZE'))
+        config.set_setting('UPLOAD_CHUNK_SIZE', 4)
+        self.payload = b'0123456789'
+
+    def start(self):
+        response = self.client.post('/api/uploads/', {'filename': 'movie.mp4', 'size': len(self.payload)},
+                                    format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['chunk_count'], 3)
+        return response.data['id']
+
+    def put_chunk(self, upload_id, index, data):
+        return self.client.put(f'/api/uploads/{upload_id}/chunks/{index}/', data,
+                               content_type='application/octet-stream')
+
+    def test_out_of_order_chunks_are_assembled_into_a_video_post(self):
+        upload_id = self.start()
+        self.assertEqual(self.put_chunk(upload_id, 2, b'89').status_code, 200)
+        self.assertEqual(self.put_chunk(upload_id, 0, b'0123').status_code, 200)
+
+        state = self.client.get(f'/api/uploads/{upload_id}/').data
+        self.assertEqual(state['received_chunks'], [0, 2])
+        self.assertEqual(state['received_offsets'], [0, 8])
+        self.assertEqual(self.client.post(f'/api/uploads/{upload_id}/complete/').status_code, 400)
+
+        self.assertEqual(self.put_chunk(upload_id, 1, b'4567').status_code, 200)
+        self.assertEqual(self.put_chunk(upload_id, 1, b'4567').status_code, 200)  # retried chunk
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/uploads/{upload_id}/complete/', {'title': 'film', 'content': 'watch'},
+                                        format='json')
+
+        self.assertEqual(response.status_code, 201)
+        post = Post.objects.get(pk=response.data['id'])
+        self.assertEqual(post.post_type, 'video')
+        with post.media.open('rb') as media:
+            self.assertEqual(media.read(), self.payload)
+        self.assertEqual(self.client.get(f'/api/uploads/{upload_id}/').status_code, 404)
+        self.assertEqual(os.listdir(settings.UPLOAD_SESSION_ROOT), [])
+
+    def test_unsupported_formats_are_rejected_when_the_session_opens(self):
+        response = self.client.post('/api/uploads/', {'filename': 'movie.mkv', 'size': len(self.payload)},
+                                    format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_assembly_runs_outside_the_transaction(self):
+        upload_id = self.start()
+        for index, data in enumerate((b'0123', b'4567', b'89')):
+            self.put_chunk(upload_id, index, data)
+        assemble = resumable.assemble
+        depths = []
+
+        def spy(session):
+            depths.append(len(connection.savepoint_ids))
+            return assemble(session)
+        resumable.assemble = spy
+        self.addCleanup(setattr, resumable, 'assemble', assemble)
+        # Savepoints stand in for transactions inside TestCase's own atomic blocks
+        depth = len(connection.savepoint_ids)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/uploads/{upload_id}/complete/', {'content': 'watch'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(depths, [depth])
+
+    def test_chunks_of_the_wrong_size_are_rejected(self):
+        upload_id = self.start()
+        self.assertEqual(self.put_chunk(upload_id, 0, b'01').status_code, 400)
+        self.assertEqual(self.put_chunk(upload_id, 0, b'012345').status_code, 400)
+        self.assertEqual(self.put_chunk(upload_id, 3, b'0').status_code, 400)
+        self.assertEqual(self.client.get(f'/api/uploads/{upload_id}/').data['received_chunks'], [])
+
+    def test_cleanup_discards_abandoned_sessions(self):
+        upload_id = self.start()
+        self.put_chunk(upload_id, 0, b'0123')
+        UploadSession.objects.update(updated_at=datetime(2024, 1, 1, tzinfo=dt_timezone.utc))
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('cleanup_upload_sessions', stdout=StringIO())
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(os.listdir(settings.UPLOAD_SESSION_ROOT), [])
+
+
+class MediaBlobTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='reposter', password='testpass123')
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        paths = override_settings(MEDIA_ROOT=self.media_root)
+        paths.enable()
+        self.addCleanup(paths.disable)
+
+    def image(self, data=b'GIF89a-meme'):
+        return SimpleUploadedFile('meme.gif', data, content_type='image/gif')
+
+    def stored_files(self):
+        return sum(len(files) for _, _, files in os.walk(self.media_root))
+
+    def test_identical_uploads_share_one_blob_until_the_last_reference_goes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = Post.objects.create(author=self.user, content='a', post_type='image', media=self.image())
+            second = Post.objects.create(author=self.user, content='b', post_type='image', media=self.image())
+
+        self.assertEqual(first.media.name, second.media.name)
+        self.assertEqual(self.stored_files(), 1)
+        self.assertEqual(MediaBlob.objects.get(pk=first.media.name).ref_count, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.get(pk=first.pk).delete()
+        self.assertEqual(self.stored_files(), 1)
+        self.assertEqual(MediaBlob.objects.get(pk=second.media.name).ref_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.get(pk=second.pk).delete()
+        self.assertEqual(self.stored_files(), 0)
+        self.assertFalse(MediaBlob.objects.exists())
+
+    def test_profiles_and_posts_share_blobs_and_replacing_releases(self):
+        profile = self.user.profile
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.avatar = self.image()
+            profile.save()
+            post = Post.objects.create(author=self.user, content='a', post_type='image', media=self.image())
+        self.assertEqual(MediaBlob.objects.get(pk=post.media.name).ref_count, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            profile = User.objects.get(pk=self.user.pk).profile
+            profile.avatar = self.image(b'GIF89a-new-face')
+            profile.save()
+        self.assertEqual(MediaBlob.objects.get(pk=post.media.name).ref_count, 1)
+        self.assertEqual(MediaBlob.objects.get(pk=profile.avatar.name).ref_count, 1)
+        self.assertEqual(self.stored_files(), 2)
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='photographer', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        paths = override_settings(MEDIA_ROOT=self.media_root)
+        paths.enable()
+        self.addCleanup(paths.disable)
+        cache.clear()
+
+    def png(self, size=(800, 400)):
+        buffer = BytesIO()
+        Image.new('RGB', size, (200, 40, 40)).save(buffer, format='PNG')
+        return SimpleUploadedFile('photo.png', buffer.getvalue(), content_type='image/png')
+
+    def test_srcset_falls_back_to_original_until_derivatives_exist(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(author=self.user, content='pic', post_type='image', media=self.png())
+
+        response = self.client.get(f'/api/posts/{post.id}/')
+        srcset = response.data['media_srcset']
+        self.assertEqual(list(srcset), ['default'])
+        self.assertTrue(srcset['default'].endswith(post.media.url))
+
+        self.assertEqual(derivatives.process_pending(workers=2), 1)
+        self.assertEqual(derivatives.process_pending(), 0)
+        # The srcset changed, so the old ETag no longer matches
+        self.assertEqual(self.client.get(f'/api/posts/{post.id}/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+        srcset = self.client.get('/api/feed/').data['results'][0]['media_srcset']
+        self.assertEqual([entry.split()[-1] for entry in srcset['image/webp'].split(', ')], ['320w', '640w', '800w'])
+        self.assertEqual(srcset['default'].count('w.jpeg'), 3)
+        with Image.open(os.path.join(self.media_root, derivatives.derivative_name(post.media.name, 320, 'webp'))) as small:
+            self.assertEqual(small.size, (320, 160))
+
+        tile = self.client.get('/api/profiles/photographer/posts/?tab=media').data['results'][0]
+        self.assertTrue(tile['thumbnail_url'].endswith('/320w.jpeg'))
+
+    def test_unreadable_images_keep_the_original(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(author=self.user, content='pic', post_type='image',
+                                       media=SimpleUploadedFile('broken.png', b'not a png'))
+        derivatives.process_pending()
+        self.assertEqual(MediaBlob.objects.get(pk=post.media.name).derivatives, {})
+        self.assertEqual(list(self.client.get(f'/api/posts/{post.id}/').data['media_srcset']), ['default'])
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        paths = override_settings(MEDIA_ROOT=self.media_root)
+        paths.enable()
+        self.addCleanup(paths.disable)
+        self.data = bytes(range(256)) * 40
+        digest = hashlib.sha256(self.data).hexdigest()
+        self.name = blob_name(digest, '.mp4')
+        os.makedirs(os.path.dirname(os.path.join(self.media_root, self.name)))
+        with open(os.path.join(self.media_root, self.name), 'wb') as f:
+            f.write(self.data)
+        self.url = settings.MEDIA_URL + self.name
+        self.etag = f'"{digest}"'
+
+    def test_blobs_are_immutable_with_content_hash_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+        self.assertEqual(response['ETag'], self.etag)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_byte_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-299')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-299/{len(self.data)}')
+        self.assertEqual(response['Content-Length'], '200')
+        self.assertEqual(b''.join(response.streaming_content), self.data[100:300])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), self.data[-10:])
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.data)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.data)}')
+
+        # A stale If-Range gets the whole file
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"old"')
+        self.assertEqual(response.status_code, 200)
+
+    async def test_asgi_streams_asynchronously(self):
+        response = await self.async_client.get(self.url, headers={'Range': 'bytes=0-99'})
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response.is_async)
+        self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), self.data[:100])
+
+    def test_missing_and_escaping_paths_404(self):
+        self.assertEqual(self.client.get(settings.MEDIA_URL + 'nope.png').status_code, 404)
+        self.assertEqual(self.client.get(settings.MEDIA_URL + '../manage.py').status_code, 404)
+
+    @override_settings(MEDIA_ACCEL='x-accel', MEDIA_ACCEL_PREFIX='/protected-media/')
+    def test_proxy_offload_sends_no_body(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.name)
+        self.assertEqual(response['ETag'], self.etag)
+        self.assertEqual(response.content, b'')
+
+    @override_settings(MEDIA_ACCEL='nginx')
+    def test_unknown_proxy_offload_streams_and_is_reported(self):
+        response = self.client.get(self.url)
+        self.assertNotIn('X-Sendfile', response)
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+        self.assertEqual([message.id for message in check_media_accel(None)], ['posts.W001'])
@@ -0,0 +1,106 @@
+from django.contrib.auth.models import User
+from django.db.models import F, OuterRef, Subquery, Window
+from django.db.models.functions import RowNumber
+from .models import Post, TimelineEntry, UserFollow
+from singletons.config_manager import ConfigManager
+
+
+def _max_length():
+    return ConfigManager().get_setting('TIMELINE_MAX_LENGTH')
+
+
+def fan_out_posts(posts):
+    """Push newly created posts into followers' timelines; returns the follower ids touched"""
+    posts = [post for post in posts if post.pk]
+    if not posts:
+        return set()
+
+    author_ids = {post.author_id for post in posts}
+    followers = {}
+    for follower_id, followed_id in UserFollow.objects.filter(
+            followed_id__in=author_ids).values_list('follower_id', 'followed_id'):
+        followers.setdefault(followed_id, []).append(follower_id)
+
+    entries = [
+        TimelineEntry(user_id=follower_id, post_id=post.pk, post_created_at=post.created_at)
+        for post in posts
+        for follower_id in followers.get(post.author_id, [])
+    ]
+    if not entries:
+        return set()
+
+    follower_ids = {entry.user_id for entry in entries}
+    TimelineEntry.objects.bulk_create(entries, batch_size=500, ignore_conflicts=True)
+    trim_timelines(follower_ids)
+    return follower_ids
+
+
+def fan_out_post(post):
+    """Push a single new post into its author's followers' timelines"""
+    return fan_out_posts([post])
+
+
+def backfill_follow(follower_id, followed_id):
+    """Copy the followed user's most recent posts into the follower's timeline"""
+    recent_posts = Post.objects.filter(author_id=followed_id)\
+        .order_by('-created_at')\
+        .values_list('id', 'created_at')[:_max_length()]
+
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=follower_id, post_id=post_id, post_created_at=created_at)
+         for post_id, created_at in recent_posts],
+        batch_size=500,
+        ignore_conflicts=True
+    )
+    trim_timelines([follower_id])
+
+
+def prune_follow(follower_id, followed_id):
+    """Remove the unfollowed user's posts from the follower's timeline"""
+    TimelineEntry.objects.filter(user_id=follower_id, post__author_id=followed_id).delete()
+
+
+def overflowing(user_ids, limit):
+    """The users among ``user_ids`` with more than ``limit`` entries, probed through timeline_user_recent_idx"""
+    beyond = TimelineEntry.objects.filter(user_id=OuterRef('pk'))\
+        .order_by('-post_created_at')\
+        .values('id')[limit:limit + 1]
+    return list(
+        User.objects.filter(pk__in=list(user_ids))
+        .annotate(beyond=Subquery(beyond))
+        .filter(beyond__isnull=False)
+        .values_list('pk', flat=True)
+    )
+
+
+def trim_timelines(user_ids):
+    """
+    Drop entries beyond the configured cap, oldest first. Timelines are only
+    trimmed once they pass the cap by TIMELINE_TRIM_SLACK, so most new posts
+    cost an index probe per follower instead of ranking whole timelines.
+    """
+    if not user_ids:
+        return
+    user_ids = overflowing(user_ids, _max_length() + ConfigManager().get_setting('TIMELINE_TRIM_SLACK'))
+    if not user_ids:
+        return
+
+    overflow = TimelineEntry.objects.filter(user_id__in=user_ids)\
+        .annotate(position=Window(
+            expression=RowNumber(),
+            partition_by=[F('user_id')],
+            order_by=[F('post_created_at').desc(), F('post_id').desc()]
+        ))\
+        .filter(position__gt=_max_length())\
+        .values_list('id', flat=True)
+
+    overflow_ids = list(overflow)
+    if overflow_ids:
+        TimelineEntry.objects.filter(id__in=overflow_ids).delete()
+
+
+def rebuild_timeline(user_id):
+    """Recreate a single user's timeline from their current follows"""
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    for followed_id in UserFollow.objects.filter(follower_id=user_id).values_list('followed_id', flat=True):
+        backfill_follow(user_id, followed_id)
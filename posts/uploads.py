@@ -0,0 +1,114 @@
+"""
+Streaming upload handling.
+
+Every uploaded file is written chunk by chunk to a temporary file on disk
+while its size and SHA-256 are computed, so a worker holds at most one chunk
+of any upload in memory. Files over MAX_FILE_SIZE are abandoned as soon as
+the limit is crossed; the view then answers 413 via upload_error().
+
+Under ASGI, Django reads the whole request body into a spooled temporary
+file before any upload handler runs, so the handler cannot stop an
+oversized body from being received. BodySizeLimitMiddleware wraps the ASGI
+application and answers 413 before that happens.
+"""
+import hashlib
+import json
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from singletons.config_manager import ConfigManager
+
+
+class HashingFileUploadHandler(FileUploadHandler):
+    """Spool uploads to disk, tracking size and sha256 (exposed on the file as ``.sha256``)"""
+
+    chunk_size = getattr(settings, 'FILE_UPLOAD_CHUNK_SIZE', 64 * 1024)
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.max_size = ConfigManager().get_setting('MAX_FILE_SIZE')
+        self.size = 0
+        self.digest = hashlib.sha256()
+        self.file = TemporaryUploadedFile(self.file_name, self.content_type, 0, self.charset,
+                                          self.content_type_extra)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > self.max_size:
+            self.request.upload_error = (
+                f'{self.field_name} exceeds the maximum size of {self.max_size / 1024 / 1024:.1f}MB'
+            )
+            # Stop reading the body instead of draining gigabytes we will discard
+            raise StopUpload(connection_reset=True)
+        self.digest.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.sha256 = self.digest.hexdigest()
+        return self.file
+
+    def upload_interrupted(self):
+        if hasattr(self, 'file'):
+            self.file.close()
+
+
+def upload_error(request):
+    """Message for an upload the handler rejected while parsing ``request``, or None"""
+    # Parsing is lazy; touching request.data makes the handlers run
+    request.data
+    return getattr(request, 'upload_error', None)
+
+
+def max_body_size():
+    """Largest accepted request body: one file of MAX_FILE_SIZE plus the non-file form data"""
+    return ConfigManager().get_setting('MAX_FILE_SIZE') + settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+
+
+class BodySizeLimitMiddleware:
+    """
+    ASGI middleware answering 413 for bodies over max_body_size(): up front
+    from Content-Length, or once a chunked body crosses the limit (the
+    application then sees the client disconnect and stops reading).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        limit = max_body_size()
+        declared = dict(scope['headers']).get(b'content-length', b'')
+        if declared.isdigit() and int(declared) > limit:
+            return await self.reject(send, limit)
+
+        received = 0
+        rejected = False
+
+        async def limited_receive():
+            nonlocal received, rejected
+            if rejected:
+                return {'type': 'http.disconnect'}
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > limit:
+                    rejected = True
+                    await self.reject(send, limit)
+                    return {'type': 'http.disconnect'}
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    @staticmethod
+    async def reject(send, limit):
+        body = json.dumps({'error': f'Request body exceeds the maximum size of {limit / 1024 / 1024:.1f}MB'})
+        await send({
+            'type': 'http.response.start',
+            'status': 413,
+            'headers': [(b'content-type', b'application/json'), (b'connection', b'close')],
+        })
+        await send({'type': 'http.response.body', 'body': body.encode()})
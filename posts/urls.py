@@ -3,12 +3,13 @@ from django.urls import path, include
 from rest_framework.authtoken.views import obtain_auth_token
 from .views import (
     UserListCreate, UserDetail,
-    PostListCreate, PostDetail,
+    PostListCreate, PostBulkCreate, PostDetail,
+    UploadSessionCreate, UploadSessionDetail, UploadChunkView, UploadCompleteView,
     CommentListCreate, CommentDetail,
-    LoginView, PostLikeView, NewsFeedView,
+    LoginView, PostLikeView, NewsFeedView, FeedCacheStatsView,
     login_view, home_view, logout_view,
-    APIDocsView, post_comments, profile_view,
-    UserProfileView, UserProfilePostsView, UserFollowView
+    APIDocsView, post_comments, profile_view, feed_events,
+    UserProfileView, UserProfilePostsView, UserFollowView, FollowSuggestionsView
 )
 
 # Frontend URLs
@@ -35,8 +36,15 @@ api_urlpatterns = [
     
     # Post URLs
     path('posts/', PostListCreate.as_view(), name='post-list-create'),
+    path('posts/bulk/', PostBulkCreate.as_view(), name='post-bulk-create'),
     path('posts/<int:pk>/', PostDetail.as_view(), name='post-detail'),
     
+    # Resumable upload URLs
+    path('uploads/', UploadSessionCreate.as_view(), name='upload-create'),
+    path('uploads/<uuid:upload_id>/', UploadSessionDetail.as_view(), name='upload-detail'),
+    path('uploads/<uuid:upload_id>/chunks/<int:index>/', UploadChunkView.as_view(), name='upload-chunk'),
+    path('uploads/<uuid:upload_id>/complete/', UploadCompleteView.as_view(), name='upload-complete'),
+    
     # Comment URLs
     path('comments/', CommentListCreate.as_view(), name='comment-list-create'),
     path('comments/<int:pk>/', CommentDetail.as_view(), name='comment-detail'),
@@ -46,12 +54,15 @@ api_urlpatterns = [
     
     # Feed URL
     path('feed/', NewsFeedView.as_view(), name='news-feed'),
+    path('feed/cache-stats/', FeedCacheStatsView.as_view(), name='feed-cache-stats'),
+    path('events/', feed_events, name='feed-events'),
     
     # Post Comments URL
     path('posts/<int:post_id>/comments/', post_comments, name='post-comments'),
     
 # Profile URLs 
     path('profiles/me/', UserProfileView.as_view(), name='my-profile'),
+    path('profiles/me/suggestions/', FollowSuggestionsView.as_view(), name='follow-suggestions'),
     path('profiles/<str:username>/', UserProfileView.as_view(), name='user-profile'),
     path('profiles/<str:username>/posts/', UserProfilePostsView.as_view(), name='profile-posts'),
     path('profiles/<str:username>/follow/', UserFollowView.as_view(), name='user-follow'),
@@ -1,9 +1,11 @@
 
+import io
 import json
+from datetime import datetime, time
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import NotFound, ValidationError as DRFValidationError
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.authentication import TokenAuthentication, SessionAuthentication
@@ -15,13 +17,23 @@ from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
 from django.conf import settings
+from django.http import Http404, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
 from django.contrib import messages
 from django.db import IntegrityError, transaction
-from .models import Post, Comment, Like, UserFollow
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from .models import Post, Comment, Like, UserFollow, UserProfile, UploadSession
 from .serializers import (UserSerializer, PostSerializer, CommentSerializer, 
-                        LikeSerializer, UserProfileSerializer)
+                        LikeSerializer, UserProfileSerializer, PostGridSerializer, new_post_context)
 from .permissions import IsPostAuthor, IsCommentAuthor, IsAdminUser, ReadOnly
+from .pagination import KeysetPagination, NewsFeedPagination, CommentPagination, LikePagination
+from .conditional import make_etag, not_modified, set_validators
+from .uploads import upload_error
+from .row_serializers import PostRowSerializer, CommentRowSerializer
+from . import feed_cache, feed_delta, follow_graph, like_buffer, likes, pubsub, ranking, resumable
 from singletons.logger_singleton import LoggerSingleton
 from singletons.config_manager import ConfigManager
 from factories.post_factory import PostFactory
@@ -107,16 +119,37 @@ class PostDetail(APIView):
     permission_classes = [IsAuthenticated, IsPostAuthor]
     parser_classes = (MultiPartParser, FormParser, JSONParser)
     def get(self, request, pk):
-        """Retrieve a post"""
-        post = get_object_or_404(Post, pk=pk)
+        """Retrieve a post, answering 304 when the client's copy is still current"""
+        # The selected viewer fields are read in the same query so the ETag carries them;
+        # they change without touching the post, hence no Last-Modified
+        selected = PostSerializer.selected_fields(request)
+        viewer = {}
+        if 'liked_by_me' in selected:
+            viewer['liked'] = Exists(Like.objects.filter(post=OuterRef('pk'), user=request.user))
+        if 'is_following' in selected:
+            viewer['following'] = Exists(UserFollow.objects.filter(follower=request.user, followed=OuterRef('author')))
+        state = Post.objects.filter(pk=pk).annotate(**viewer)\
+            .values('updated_at', 'activity_at', 'like_count', 'comment_count', *viewer).first()
+        if state is None:
+            raise Http404
+        etag = make_etag('post', pk, *state.values(), like_buffer.pending(pk), request.user.id)
+        unchanged = not_modified(request, etag)
+        if unchanged is not None:
+            return unchanged
+
+        post = get_object_or_404(PostSerializer.select_related(Post.objects.all(), request), pk=pk)
         serializer = PostSerializer(post, context={'request': request})
-        return Response(serializer.data)
+        return set_validators(Response(serializer.data), etag)
 
     def put(self, request, pk):
         """Update a post"""
         post = get_object_or_404(Post, pk=pk)
         
         # Permission check is handled by IsPostAuthor permission class
+
+        rejected = upload_error(request)
+        if rejected:
+            return Response({'error': rejected}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
             
         try:
             serializer = PostSerializer(post, data=request.data, partial=True, context={'request': request})
@@ -154,14 +187,20 @@ class PostListCreate(APIView):
         self.config = ConfigManager()
 
     def get(self, request):
-        """List all posts with their comments"""
+        """List posts newest first, filtered by author, post_type and created_at range"""
         try:
-            page_size = self.config.get_setting('DEFAULT_PAGE_SIZE')
-            posts = Post.objects.all()[:page_size]
-            serializer = PostSerializer(posts, many=True, context={'request': request})
-            response = Response(serializer.data)
+            posts = self.filter_posts(Post.objects.all(), request.query_params)
+            posts = PostSerializer.select_related(posts.order_by('-created_at', '-id'), request)
+
+            paginator = KeysetPagination()
+            paginator.page_size = self.config.get_setting('DEFAULT_PAGE_SIZE')
+            page = paginator.paginate_queryset(posts, request, view=self)
+            serializer = PostSerializer(page, many=True, context={'request': request})
+            response = paginator.get_paginated_response(serializer.data)
             LoggerSingleton().log_api_request(request, response)
             return response
+        except (NotFound, DRFValidationError):
+            raise
         except Exception as e:
             self.logger.error(f"Error fetching posts: {str(e)}")
             return Response(
@@ -169,40 +208,69 @@ class PostListCreate(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    def filter_posts(self, posts, params):
+        """
+        Apply ?author= (id or username), ?post_type= and ?created_after=/?created_before=.
+        Filters compare columns of Post only, so each combination is a range scan
+        on one of the (author, post_type, created_at, id) indexes.
+        """
+        author = params.get('author')
+        if author:
+            if not author.isdigit():
+                author = User.objects.filter(username=author).values_list('id', flat=True).first()
+                if author is None:
+                    return posts.none()
+            posts = posts.filter(author_id=author)
+
+        post_type = params.get('post_type')
+        if post_type:
+            if post_type not in dict(Post.POST_TYPES):
+                raise DRFValidationError({'post_type': f'Must be one of {", ".join(dict(Post.POST_TYPES))}'})
+            posts = posts.filter(post_type=post_type)
+
+        created_after = self._parse_bound(params, 'created_after')
+        if created_after:
+            posts = posts.filter(created_at__gte=created_after)
+        created_before = self._parse_bound(params, 'created_before')
+        if created_before:
+            posts = posts.filter(created_at__lt=created_before)
+        return posts
+
+    def _parse_bound(self, params, name):
+        raw = params.get(name)
+        if not raw:
+            return None
+        try:
+            value = parse_datetime(raw)
+            if value is None:
+                day = parse_date(raw)
+                value = datetime.combine(day, time.min) if day else None
+        except ValueError:
+            value = None
+        if value is None:
+            raise DRFValidationError({name: 'Expected an ISO 8601 date or datetime'})
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        return value
+
     def post(self, request):
         """Create a new post with optional media"""
         try:
-            with transaction.atomic():
-                # Prepare post data
-                post_data = request.data.copy()
-                post_data['author'] = request.user.id
-                
-                # Get media file if present
-                media_file = request.FILES.get('media')
-                post_type = post_data.get('post_type', 'text')
-
-                # Let the model handle metadata validation and processing
-                if media_file:
-                    # Keep metadata as is - model's clean() method will handle validation
-                    pass
+            rejected = upload_error(request)
+            if rejected:
+                return Response({'error': rejected}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
 
-                # Create post using serializer
-                serializer = PostSerializer(data=post_data, context={'request': request})
+            with transaction.atomic():
+                # The author comes from the request and the media file goes into the
+                # same INSERT, so Post.clean() runs once and the row is written once
+                serializer = PostSerializer(data=request.data, context={'request': request})
                 if not serializer.is_valid():
                     self.logger.error(f"Validation error: {serializer.errors}")
                     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-                # Save post without media first
-                post = serializer.save()
-
-                # Handle media file separately if present
-                if media_file:
-                    # Save the file directly without opening it
-                    post.media = media_file
-                    post.save()
+                post = serializer.save(author=request.user)
 
                 # Return complete post data
-                response_serializer = PostSerializer(post, context={'request': request})
+                response_serializer = PostSerializer(post, context=new_post_context(request, post))
                 response = Response(response_serializer.data, status=status.HTTP_201_CREATED)
                 LoggerSingleton().log_api_request(request, response)
                 return response
@@ -220,13 +288,145 @@ class PostListCreate(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+class PostBulkCreate(APIView):
+    """Create many posts for the current user in one request (seeding, imports)"""
+    authentication_classes = [TokenAuthentication, SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+    parser_classes = (JSONParser,)
+
+    def post(self, request):
+        """Accepts a list of posts (or {"posts": [...]}); invalid items are reported by index"""
+        items = request.data.get('posts') if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list) or not items:
+            return Response({'error': 'Expected a non-empty list of posts'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        max_items = ConfigManager().get_setting('MAX_BULK_POSTS')
+        if len(items) > max_items:
+            return Response({'error': f'At most {max_items} posts per request'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            posts, errors = PostFactory.create_posts(request.user, items)
+        except Exception as e:
+            logger.error(f"Error bulk creating posts: {str(e)}")
+            return Response(
+                {'error': 'Failed to create posts'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        rejected = {error['index'] for error in errors}
+        accepted = [index for index in range(len(items)) if index not in rejected]
+        response = Response(
+            {
+                'created': [{'index': index, 'id': post.id} for index, post in zip(accepted, posts)],
+                'errors': errors
+            },
+            status=status.HTTP_201_CREATED if posts else status.HTTP_400_BAD_REQUEST
+        )
+        LoggerSingleton().log_api_request(request, response)
+        return response
+
+class UploadSessionCreate(APIView):
+    """Start a resumable upload for a large video post"""
+    authentication_classes = [TokenAuthentication, SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        try:
+            session = resumable.open_session(
+                request.user,
+                filename=str(request.data.get('filename', '')),
+                total_size=int(request.data.get('size', 0)),
+                content_type=str(request.data.get('content_type', ''))
+            )
+        except (TypeError, ValueError):
+            return Response({'error': 'size must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        except ValidationError as e:
+            return Response({'error': e.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(upload_session_state(session), status=status.HTTP_201_CREATED)
+
+def upload_session_state(session):
+    received = resumable.received_chunks(session)
+    return {
+        'id': str(session.id),
+        'filename': session.filename,
+        'size': session.total_size,
+        'chunk_size': session.chunk_size,
+        'chunk_count': session.chunk_count,
+        'received_chunks': received,
+        'received_offsets': [index * session.chunk_size for index in received],
+        'complete': len(received) == session.chunk_count
+    }
+
+class UploadSessionDetail(APIView):
+    """Query which chunks of an upload arrived, or abandon it"""
+    authentication_classes = [TokenAuthentication, SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, upload_id):
+        session = get_object_or_404(UploadSession, pk=upload_id, user=request.user)
+        return Response(upload_session_state(session))
+
+    def delete(self, request, upload_id):
+        session = get_object_or_404(UploadSession, pk=upload_id, user=request.user)
+        resumable.discard(session)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class UploadChunkView(APIView):
+    """Receive one chunk as the raw request body; chunks may arrive in any order"""
+    authentication_classes = [TokenAuthentication, SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def put(self, request, upload_id, index):
+        session = get_object_or_404(UploadSession, pk=upload_id, user=request.user)
+        try:
+            # Read one buffer at a time (under ASGI Django has already spooled the body
+            # to a temporary file, bounded by BodySizeLimitMiddleware)
+            size = resumable.write_chunk(session, index, request.stream or io.BytesIO())
+        except ValidationError as e:
+            return Response({'error': e.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'index': index, 'size': size})
+
+class UploadCompleteView(APIView):
+    """Assemble a finished upload into a video post"""
+    authentication_classes = [TokenAuthentication, SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, upload_id):
+        session = get_object_or_404(UploadSession, pk=upload_id, user=request.user)
+        try:
+            # The copy can take minutes for large videos, so it runs outside any transaction
+            media = resumable.assemble(session)
+            try:
+                with transaction.atomic():
+                    # A concurrent completion of the same upload waits here, then finds it gone
+                    session = get_object_or_404(UploadSession.objects.select_for_update(),
+                                                pk=upload_id, user=request.user)
+                    post = PostFactory.create_post(
+                        author=request.user,
+                        post_type='video',
+                        title=request.data.get('title') or 'Untitled Post',
+                        content=request.data.get('content', ''),
+                        metadata=request.data.get('metadata'),
+                        media=media
+                    )
+                    resumable.discard(session)
+            finally:
+                # Storage usually moved the temporary file; closing cleans up otherwise
+                media.close()
+        except ValidationError as e:
+            return Response({'error': e.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = PostSerializer(post, context=new_post_context(request, post))
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
 class CommentDetail(APIView):
     authentication_classes = [TokenAuthentication, SessionAuthentication]
     permission_classes = [IsAuthenticated, IsCommentAuthor]
     def get(self, request, pk):
         """Retrieve a comment"""
-        comment = get_object_or_404(Comment, pk=pk)
-        serializer = CommentSerializer(comment)
+        comment = get_object_or_404(CommentSerializer.select_related(Comment.objects.all(), request), pk=pk)
+        serializer = CommentSerializer(comment, context={'request': request})
         return Response(serializer.data)
 
     def put(self, request, pk):
@@ -274,7 +474,8 @@ class CommentListCreate(APIView):
             comments = Comment.objects.filter(post_id=post_id)
         else:
             comments = Comment.objects.all()
-        serializer = CommentSerializer(comments, many=True)
+        comments = CommentSerializer.select_related(comments, request)
+        serializer = CommentSerializer(comments, many=True, context={'request': request})
         return Response(serializer.data)
 
     def post(self, request):
@@ -432,11 +633,13 @@ class PostLikeView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request, pk):
-        """Get likes for a post"""
+        """Get likes for a post, newest first, one cursor page at a time"""
         post = get_object_or_404(Post, pk=pk)
-        likes = Like.objects.filter(post=post)
-        serializer = LikeSerializer(likes, many=True)
-        return Response(serializer.data)
+        likes = Like.objects.filter(post=post).select_related('user').order_by('-created_at', '-id')
+        paginator = LikePagination()
+        page = paginator.paginate_queryset(likes, request, view=self)
+        serializer = LikeSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
     
     def post(self, request, pk):
         """Like a post"""
@@ -459,30 +662,27 @@ class PostLikeView(APIView):
             status=status.HTTP_400_BAD_REQUEST
         )
         
+    def put(self, request, pk):
+        """Like a post; repeating the request is a no-op"""
+        return self._set_like(request, pk, True)
+
     def delete(self, request, pk):
-        """Unlike a post"""
-        post = get_object_or_404(Post, pk=pk)
-        like = get_object_or_404(Like, user=request.user, post=post)
-        like.delete()
-        
-        return Response(
-            {"message": "Post unliked successfully"},
-            status=status.HTTP_200_OK
-        )
+        """Unlike a post; repeating the request is a no-op"""
+        return self._set_like(request, pk, False)
 
-class FeedPagination(PageNumberPagination):
-    page_size = 5
-    page_size_query_param = 'page_size'
-    max_page_size = 100
-
-from rest_framework.generics import ListAPIView
+    def _set_like(self, request, pk, liked):
+        changed, like_count = likes.set_like(request.user.id, pk, liked)
+        if like_count is None:
+            raise Http404
+        return Response({'liked': liked, 'changed': changed, 'like_count': like_count},
+                        status=status.HTTP_200_OK)
 
 class NewsFeedView(ListAPIView):
     """Get personalized news feed for authenticated user"""
     authentication_classes = [TokenAuthentication, SessionAuthentication]
     permission_classes = [IsAuthenticated]
     serializer_class = PostSerializer
-    pagination_class = FeedPagination
+    pagination_class = NewsFeedPagination
     
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -496,26 +696,33 @@ class NewsFeedView(ListAPIView):
             show_followed = self.request.query_params.get('followed', 'false').lower() == 'true'
             show_liked = self.request.query_params.get('liked', 'false').lower() == 'true'
             post_type = self.request.query_params.get('post_type', None)
+            sort = self.request.query_params.get('sort', 'recent')
             
             # Start with all posts
             queryset = Post.objects.all()
-            
+            ordering = ('-created_at', '-id')
+
             # Apply filters
             if show_followed:
-                followed_users = UserFollow.objects.filter(follower=self.request.user).values_list('followed', flat=True)
-                queryset = queryset.filter(author__in=followed_users)
-                
+                # Read the materialized timeline instead of scanning followed authors' posts
+                queryset = queryset.filter(timeline_entries__user=self.request.user)\
+                    .annotate(feed_at=F('timeline_entries__post_created_at'))
+                ordering = ('-feed_at', '-id')
+
             if show_liked:
                 liked_posts = Like.objects.filter(user=self.request.user).values_list('post', flat=True)
                 queryset = queryset.filter(id__in=liked_posts)
                 
             if post_type:
                 queryset = queryset.filter(post_type=post_type)
+
+            if sort == 'top':
+                # Precomputed engagement score, boosted for followed authors
+                queryset = ranking.rank_for_viewer(queryset, self.request.user)
+                ordering = ('-rank', '-id')
             
-            # Sort by most recent and optimize with prefetch
-            return queryset.order_by('-created_at')\
-                .select_related('author')\
-                .prefetch_related('comments', 'likes')
+            # Sort by most recent; comment previews are fetched per page by the serializer
+            return PostSerializer.select_related(queryset.order_by(*ordering), self.request)
                 
         except Exception as e:
             logger = LoggerSingleton().get_logger()
@@ -524,12 +731,114 @@ class NewsFeedView(ListAPIView):
     
     def list(self, request, *args, **kwargs):
         try:
-            return super().list(request, *args, **kwargs)
+            if 'since' in request.query_params:
+                return self.changes(request)
+
+            # The versioned cache key and the page's post versions double as the
+            # validator: one of them changes whenever an invalidation would drop the page
+            cache_key = feed_cache.page_key(request)
+            cached = feed_cache.get_page(cache_key)
+            if cached is not None:
+                data, versions = cached
+                etag = make_etag(cache_key, versions)
+                unchanged = not_modified(request, etag)
+                if unchanged is not None:
+                    return unchanged
+                return set_validators(Response(data), etag)
+
+            # Pages are built from values() rows, bypassing PostSerializer's per-field work
+            rows = PostRowSerializer(request)
+            page = self.paginate_queryset(rows.values(self.get_queryset()))
+            response = self.get_paginated_response(rows.serialize(page))
+            if response.status_code == status.HTTP_200_OK:
+                if 'cursor' not in request.query_params:
+                    # Starting point for incremental refreshes with ?since=
+                    response.data['since'] = feed_delta.current_token()
+                versions = feed_cache.store_page(cache_key, response.data)
+                set_validators(response, make_etag(cache_key, versions))
+            return response
         except Exception as e:
             logger = LoggerSingleton().get_logger()
             logger.error(f"Error in NewsFeedView.list: {str(e)}")
             raise
 
+    def changes(self, request):
+        """New posts and counter updates since the token, for polling clients"""
+        held_ids = feed_delta.parse_held_ids(request.query_params.get('ids'))
+        new_posts, updated, token = feed_delta.changes_since(
+            self.get_queryset(), request.query_params['since'], held_ids
+        )
+        serializer = self.get_serializer(new_posts, many=True)
+        return Response({
+            'posts': serializer.data,
+            'updates': [
+                {'id': post.id, 'like_count': max(post.like_count + like_buffer.pending(post.id), 0),
+                 'comment_count': post.comment_count}
+                for post in updated
+            ],
+            'since': token
+        })
+
+class FeedCacheStatsView(APIView):
+    """Hit ratio of the feed page cache (admins only)"""
+    authentication_classes = [TokenAuthentication, SessionAuthentication]
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        return Response(feed_cache.stats())
+
+async def _stream_user(request):
+    """Resolve the user from a DRF token header or the session without blocking the loop"""
+    keyword, _, key = request.headers.get('Authorization', '').partition(' ')
+    if keyword == 'Token' and key:
+        token = await Token.objects.select_related('user').filter(key=key.strip()).afirst()
+        return token.user if token and token.user.is_active else None
+    user = await request.auser()
+    return user if user.is_authenticated else None
+
+async def feed_events(request):
+    """
+    Server-Sent Events stream of new posts by followed users and like/comment
+    count changes for the posts listed in ?posts=1,2,3. The follow list is read
+    when the stream opens; clients reconnect to pick up follow changes.
+    """
+    if not isinstance(request, ASGIRequest):
+        # A WSGI server would collect the endless stream into a list and never respond
+        return JsonResponse({'detail': 'Live events require the ASGI server; poll /api/feed/?since= instead.'},
+                            status=501)
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    user = await _stream_user(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+    try:
+        post_ids = feed_delta.parse_held_ids(request.GET.get('posts'))
+    except DRFValidationError:
+        return JsonResponse({'posts': 'Expected a comma separated list of post ids'}, status=400)
+
+    followed = UserFollow.objects.filter(follower=user).values_list('followed_id', flat=True)
+    channels = [pubsub.author_channel(author_id) async for author_id in followed]
+    channels += [pubsub.post_channel(post_id) for post_id in post_ids]
+    keepalive = ConfigManager().get_setting('EVENT_STREAM_KEEPALIVE')
+
+    async def stream():
+        subscription = await pubsub.get_broker().subscribe(channels)
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                event = await subscription.get(timeout=keepalive)
+                if event is None:
+                    yield ': keepalive\n\n'
+                else:
+                    yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            await subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
 def post_comments(request, post_id):
@@ -537,9 +846,17 @@ def post_comments(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     
     if request.method == 'GET':
-        comments = Comment.objects.filter(post=post).order_by('created_at')
-        serializer = CommentSerializer(comments, many=True)
-        return Response(serializer.data)
+        # Comment writes and edits move comment_count/activity_at on the post
+        etag = make_etag('comments', post.id, post.comment_count, post.activity_at)
+        unchanged = not_modified(request, etag, post.activity_at)
+        if unchanged is not None:
+            return unchanged
+
+        rows = CommentRowSerializer(request)
+        comments = Comment.objects.filter(post=post).order_by('created_at', 'id')
+        paginator = CommentPagination()
+        page = paginator.paginate_queryset(rows.values(comments), request)
+        return set_validators(paginator.get_paginated_response(rows.serialize(page)), etag, post.activity_at)
         
     elif request.method == 'POST':
         try:
@@ -576,16 +893,32 @@ class UserProfileView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request, username=None):
-        """Get user profile data"""
+        """Get user profile data, answering 304 when the client's copy is still current"""
         try:
+            users = User.objects.select_related('profile')
+            if 'is_following' in UserProfileSerializer.selected_fields(request):
+                users = users.annotate(followed_by_viewer=Exists(
+                    UserFollow.objects.filter(follower=request.user, followed=OuterRef('pk'))
+                ))
             if username is None:
-                user = request.user
+                user = users.get(pk=request.user.pk)
             else:
-                user = User.objects.get(username=username)
+                user = users.get(username=username)
             
             profile = user.profile
+            # Profile edits touch updated_at; posts and follows move the counters. Whether
+            # the viewer follows is read alongside; since it changes without touching the
+            # profile there is no Last-Modified to revalidate against
+            etag = make_etag('profile', user.id, user.username, user.first_name, user.last_name,
+                             profile.updated_at, profile.posts_count, profile.followers_count,
+                             profile.following_count, request.user.id,
+                             getattr(user, 'followed_by_viewer', None))
+            unchanged = not_modified(request, etag)
+            if unchanged is not None:
+                return unchanged
+
             serializer = UserProfileSerializer(profile, context={'request': request})
-            return Response(serializer.data)
+            return set_validators(Response(serializer.data), etag)
             
         except User.DoesNotExist:
             return Response(
@@ -609,6 +942,10 @@ class UserProfileView(APIView):
                     status=status.HTTP_403_FORBIDDEN
                 )
                 
+            rejected = upload_error(request)
+            if rejected:
+                return Response({'error': rejected}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
             user = request.user
             profile = user.profile
             data = request.data
@@ -618,23 +955,23 @@ class UserProfileView(APIView):
                 names = data['full_name'].split(' ', 1)
                 user.first_name = names[0]
                 user.last_name = names[1] if len(names) > 1 else ''
-                user.save()
+                user.save(update_fields=['first_name', 'last_name'])
                 
-            # Update profile fields
-            if 'bio' in data:
-                profile.bio = data['bio']
-            if 'location' in data:
-                profile.location = data['location']
-            if 'website' in data:
-                profile.website = data['website']
+            # Update profile fields; only the edited columns are written, so the
+            # counters moved by concurrent posts and follows are left alone
+            edited = ['updated_at']
+            for field in ('bio', 'location', 'website'):
+                if field in data:
+                    setattr(profile, field, data[field])
+                    edited.append(field)
 
             # Handle media files
-            if 'avatar' in request.FILES:
-                profile.avatar = request.FILES['avatar']
-            if 'cover_photo' in request.FILES:
-                profile.cover_photo = request.FILES['cover_photo']
+            for field in ('avatar', 'cover_photo'):
+                if field in request.FILES:
+                    setattr(profile, field, request.FILES[field])
+                    edited.append(field)
                 
-            profile.save()
+            profile.save(update_fields=edited)
             
             # Return updated profile data
             serializer = UserProfileSerializer(profile, context={'request': request})
@@ -654,25 +991,37 @@ class UserProfilePostsView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request, username):
-        """Get user posts based on tab query parameter (posts/media/liked)"""
+        """
+        One cursor page of the user's posts for a tab: ``posts``, ``media`` (as
+        compact grid tiles) or ``liked`` (most recently liked first)
+        """
         try:
             user = get_object_or_404(User, username=username)
             tab = request.GET.get('tab', 'posts')
-            
+            paginator = KeysetPagination()
+
             if tab == 'posts':
-                posts = Post.objects.filter(author=user)
+                rows = PostRowSerializer(request)
+                posts = Post.objects.filter(author=user).order_by('-created_at', '-id')
+                data = rows.serialize(paginator.paginate_queryset(rows.values(posts), request, view=self))
             elif tab == 'media':
-                posts = Post.objects.filter(author=user, post_type__in=['image', 'video'])
+                posts = Post.objects.filter(author=user, post_type__in=['image', 'video'])\
+                    .only('id', 'post_type', 'media', 'like_count', 'comment_count', 'created_at')\
+                    .order_by('-created_at', '-id')
+                page = paginator.paginate_queryset(posts, request, view=self)
+                data = PostGridSerializer(page, many=True, context={'request': request}).data
             elif tab == 'liked':
-                liked_posts = Like.objects.filter(user=user).values_list('post', flat=True)
-                posts = Post.objects.filter(id__in=liked_posts)
+                # Page through the user's likes (cursor on like time) joined to their posts
+                rows = PostRowSerializer(request, prefix='post__')
+                liked = Like.objects.filter(user=user).order_by('-created_at', '-id')
+                data = rows.serialize(paginator.paginate_queryset(rows.values(liked), request, view=self))
             else:
                 return Response({"error": "Invalid tab"}, status=status.HTTP_400_BAD_REQUEST)
-            
-            posts = posts.order_by('-created_at')
-            serializer = PostSerializer(posts, many=True, context={'request': request})
-            return Response({'results': serializer.data})
-            
+
+            return paginator.get_paginated_response(data)
+
+        except NotFound:
+            raise
         except Exception as e:
             logger = LoggerSingleton().get_logger()
             logger.error(f"Error in UserProfilePostsView.get: {str(e)}")
@@ -696,14 +1045,7 @@ class UserFollowView(APIView):
         
         # Create follow relationship if it doesn't exist    
         UserFollow.objects.get_or_create(follower=request.user, followed=target_user)
-        
-        # Get updated followers count
-        followers_count = UserFollow.objects.filter(followed=target_user).count()
-            
-        return Response({
-            'success': True,
-            'followers_count': followers_count
-        })
+        return self._followed_response(target_user)
 
     def delete(self, request, username):
         """Unfollow a user"""
@@ -715,15 +1057,47 @@ class UserFollowView(APIView):
         
         # Remove follow relationship if it exists
         UserFollow.objects.filter(follower=request.user, followed=target_user).delete()
-        
-        # Get updated followers count  
-        followers_count = UserFollow.objects.filter(followed=target_user).count()
-            
+        return self._followed_response(target_user)
+
+    def _followed_response(self, target_user):
+        # Read the stored counter instead of counting the follower rows
+        followers_count = UserProfile.objects.filter(user=target_user)\
+            .values_list('followers_count', flat=True).first() or 0
         return Response({
             'success': True,
             'followers_count': followers_count
         })
 
+class FollowSuggestionsView(APIView):
+    """Accounts followed by the people the user follows, ranked by how many of them do"""
+    authentication_classes = [TokenAuthentication, SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+    max_limit = 50
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get('limit', ConfigManager().get_setting('FOLLOW_SUGGESTION_COUNT')))
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        ranked = follow_graph.suggestions(request.user.id, max(1, min(limit, self.max_limit)))
+
+        users = User.objects.select_related('profile').in_bulk([user_id for user_id, _ in ranked])
+        results = []
+        for user_id, mutual_count in ranked:
+            user = users.get(user_id)
+            if user is None:
+                # Deleted since the graph was built
+                continue
+            avatar = user.profile.avatar
+            results.append({
+                'username': user.username,
+                'full_name': user.get_full_name() or user.username,
+                'avatar_url': request.build_absolute_uri(avatar.url) if avatar else None,
+                'followers_count': user.profile.followers_count,
+                'mutual_count': mutual_count,
+            })
+        return Response({'results': results})
+
 class APIDocsView(APIView):
     """API Documentation view"""
     permission_classes = [AllowAny]
@@ -15,7 +15,24 @@ class ConfigManager:
             "MAX_POST_LENGTH": 5000,
             "MAX_COMMENT_LENGTH": 1000,
             "ALLOWED_POST_TYPES": ["text", "image", "video"],
-            "MAX_FILE_SIZE": 10 * 1024 * 1024 * 1024  # 10GB (10240MB)
+            "MAX_FILE_SIZE": 10 * 1024 * 1024 * 1024,  # 10GB (10240MB)
+            "TIMELINE_MAX_LENGTH": 800,  # Entries kept per materialized home timeline
+            "TIMELINE_TRIM_SLACK": 50,  # Entries a timeline may exceed the cap by before it is trimmed
+            "COMMENT_PREVIEW_COUNT": 3,  # Latest comments embedded in each post payload
+            "FEED_CACHE_TIMEOUT": 60,  # Seconds a serialized feed page stays cached
+            "FEED_DELTA_OVERLAP": 30,  # Seconds before a ?since= token that are re-checked for late commits
+            "RANK_DECAY_SECONDS": 45000,  # Age that outweighs a 10x engagement difference
+            "RANK_FOLLOWED_BOOST": 0.5,  # Score bonus for followed authors in the top feed
+            "EVENT_STREAM_KEEPALIVE": 15,  # Seconds between SSE keepalive comments on idle streams
+            "MAX_BULK_POSTS": 1000,  # Items accepted by one bulk create request
+            "BULK_CREATE_BATCH_SIZE": 250,  # Rows per INSERT when bulk creating posts
+            "UPLOAD_CHUNK_SIZE": 8 * 1024 * 1024,  # Bytes per chunk of a resumable upload
+            "UPLOAD_SESSION_TTL": 24 * 60 * 60,  # Seconds before an untouched upload session is discarded
+            "LIKE_FLUSH_INTERVAL": 2,  # Seconds between write-behind like count flushes (0: no flusher thread)
+            "LIKE_FLUSH_THRESHOLD": 500,  # Pending like/unlike events that trigger an immediate flush
+            "FOLLOW_GRAPH_TTL": 300,  # Seconds before a worker rebuilds its in-memory follow graph
+            "FOLLOW_GRAPH_MAX_OVERLAY": 100000,  # Follow changes layered on the graph before a rebuild
+            "FOLLOW_SUGGESTION_COUNT": 10  # Accounts returned by the "who to follow" endpoint
         }
 
     def get_setting(self, key):